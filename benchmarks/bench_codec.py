@@ -0,0 +1,50 @@
+"""Share of a poll cycle spent decoding JSON, per codec.
+
+A poll cycle is decoding a fullStatus and an energyUsage response and
+constructing the SpaStateFull. Run with:
+
+    python -m benchmarks.bench_codec
+"""
+
+import timeit
+
+from smarttub import SpaStateFull, codec
+
+from .payloads import ENERGY_USAGE, FULL_STATUS, make_spa
+
+NUMBER = 2000
+
+
+def available_codecs():
+    yield codec.StdlibJSONCodec()
+    for codec_class in (codec.OrjsonCodec, codec.MsgspecCodec):
+        try:
+            yield codec_class()
+        except RuntimeError:
+            pass
+
+
+def main():
+    spa = make_spa()
+    reference = codec.StdlibJSONCodec()
+    full_status = reference.dumps(FULL_STATUS)
+    energy_usage = reference.dumps(ENERGY_USAGE)
+    parse = timeit.timeit(lambda: SpaStateFull(spa, FULL_STATUS), number=NUMBER)
+
+    print(f"{'codec':>10} {'decode us':>10} {'cycle us':>10} {'decode %':>9}")
+    for json_codec in available_codecs():
+
+        def decode():
+            json_codec.loads(full_status)
+            json_codec.loads(energy_usage)
+
+        decode_time = timeit.timeit(decode, number=NUMBER)
+        cycle = decode_time + parse
+        print(
+            f"{json_codec.name:>10} {decode_time / NUMBER * 1e6:>10.1f}"
+            f" {cycle / NUMBER * 1e6:>10.1f} {decode_time / cycle:>9.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Memory held per SpaStateFull, measured with tracemalloc.
+
+Builds one state for each of many spas (so that no pump, light or lock is
+shared between them) from independently decoded responses, as a fleet poller
+keeping the latest status of every spa would. Run with:
+
+    python -m benchmarks.bench_memory
+"""
+
+import json
+import tracemalloc
+
+from smarttub import SmartTub, Spa, SpaStateFull
+
+from .payloads import FULL_STATUS
+
+SPAS = 2000
+
+
+def main():
+    api = SmartTub()
+    spas = [
+        Spa(api, None, id=f"spa{i}", brand="brand1", model="model1")
+        for i in range(SPAS)
+    ]
+    encoded = json.dumps(FULL_STATUS)
+    responses = [json.loads(encoded) for _ in spas]
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    states = [SpaStateFull(spa, response) for spa, response in zip(spas, responses)]
+    for state in states:
+        # as a consumer would
+        state.locks
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    print(
+        f"{allocated / len(states):,.0f} bytes per SpaStateFull"
+        " (excluding the decoded response)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""SpaStateFull construction rate.
+
+Measures constructing a SpaStateFull alone, then also reading a few fields (as
+a poller typically does) or every field, and building one from the previous
+state with a single pump changed. Run with:
+
+    python -m benchmarks.bench_state_parse
+"""
+
+import copy
+import timeit
+
+from inflection import underscore
+
+from smarttub import SpaState, SpaStateFull
+
+from .payloads import FULL_STATUS, make_spa
+
+NUMBER = 5000
+
+ATTRIBUTES = [
+    underscore(field if isinstance(field, str) else field[0])
+    for field in SpaState.FIELDS
+]
+
+
+def read_few(state):
+    state.heater
+    state.set_temperature
+    state.water.temperature
+
+
+def read_all(state):
+    for attribute in ATTRIBUTES:
+        getattr(state, attribute)
+
+
+def main():
+    spa = make_spa()
+    previous = SpaStateFull(spa, FULL_STATUS)
+    read_all(previous)
+    changed = copy.deepcopy(FULL_STATUS)
+    changed["pumps"][0]["state"] = "HIGH"
+    cases = {
+        "construct": lambda: SpaStateFull(spa, FULL_STATUS),
+        "read 3 fields": lambda: read_few(SpaStateFull(spa, FULL_STATUS)),
+        "read all fields": lambda: read_all(SpaStateFull(spa, FULL_STATUS)),
+        "from previous": lambda: read_all(
+            SpaStateFull.from_previous(previous, changed)
+        ),
+    }
+    for name, func in cases.items():
+        elapsed = min(timeit.repeat(func, number=NUMBER, repeat=5))
+        print(
+            f"{name:>16}: {elapsed / NUMBER * 1e6:7.1f} us per state,"
+            f" {NUMBER / elapsed:9,.0f} states/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Cost of parsing the timestamps in a fullStatus response.
+
+Compares dateutil.parser.isoparse with the cached parser used by SpaState,
+with an empty cache (the first poll) and a warm one (later polls, which
+repeat most timestamps). Run with:
+
+    python -m benchmarks.bench_timestamps
+"""
+
+import timeit
+
+import dateutil.parser
+
+from smarttub.api import _parse_timestamp
+
+from .payloads import FULL_STATUS
+
+NUMBER = 5000
+
+
+def timestamps(status: dict) -> list[str]:
+    values = [status["lastUpdated"], status["water"]["temperatureLastUpdated"]]
+    values += [v for v in status["fieldsLastUpdated"].values() if v is not None]
+    values += [status["primaryFiltration"]["lastUpdated"]]
+    values += [status["secondaryFiltration"]["lastUpdated"]]
+    return values
+
+
+def parse_all(parse, values):
+    for value in values:
+        parse(value)
+
+
+def main():
+    values = timestamps(FULL_STATUS)
+
+    def cold():
+        _parse_timestamp.cache_clear()
+        parse_all(_parse_timestamp, values)
+
+    cases = {
+        "dateutil": lambda: parse_all(dateutil.parser.isoparse, values),
+        "cold cache": cold,
+        "warm cache": lambda: parse_all(_parse_timestamp, values),
+    }
+    print(f"{len(values)} timestamps per snapshot")
+    for name, func in cases.items():
+        elapsed = min(timeit.repeat(func, number=NUMBER, repeat=5))
+        print(f"{name:>12}: {elapsed / NUMBER * 1e6:6.1f} us per snapshot")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Representative API payloads shared by the benchmarks"""
+
+import copy
+
+FULL_STATUS = {
+    "ambientTemperature": 65.6,
+    "blowoutCycle": "INACTIVE",
+    "cleanupCycle": "INACTIVE",
+    "current": {"average": 9.5, "kwh": 0.375, "max": 9.6, "min": 9.4, "value": 9.5},
+    "date": "2021-03-07",
+    "demoMode": "DISABLED",
+    "dipSwitches": 8,
+    "displayTemperatureFormat": "FAHRENHEIT",
+    "error": {"code": 0, "description": None, "title": "All Clear"},
+    "errorCode": 0,
+    "fieldsLastUpdated": {
+        "cfstEvent": "2021-03-07T08:36:52.908Z",
+        "errEvent": "2021-03-07T08:00:29.813Z",
+        "heatMode": "2021-02-22T07:21:26.598Z",
+        "locEvent": "2021-03-07T01:20:34.262Z",
+        "online": "2021-03-07T22:04:13.477Z",
+        "rpstEvent": "2021-03-07T22:05:21.288Z",
+        "setTemperature": "2021-02-26T05:00:27.580Z",
+        "sp2stEvent": "2021-03-07T08:36:54.867Z",
+        "spstEvent": "2021-03-07T21:39:11.540Z",
+        "uv": "2021-03-07T20:01:23.870Z",
+        "uvOnDemand": "2021-02-13T04:36:06.268Z",
+        "wcstEvent": "2021-03-07T21:59:14.378Z",
+    },
+    "flowSwitch": "OPEN",
+    "heatMode": "AUTO",
+    "heater": "OFF",
+    "highTemperatureLimit": 38.9,
+    "lastUpdated": "2021-03-07T22:05:21.440Z",
+    "lights": [
+        {
+            "color": {"blue": 0, "green": 0, "red": 0, "white": 0},
+            "cycleSpeed": 0,
+            "intensity": 0,
+            "mode": "OFF",
+            "zone": zone,
+        }
+        for zone in (1, 2, 3)
+    ],
+    "location": {"accuracy": 1053.0, "latitude": 27.129, "longitude": -27.906},
+    "locks": {
+        "access": "UNLOCKED",
+        "maintenance": "UNLOCKED",
+        "spa": "LOCKED",
+        "temperature": "UNLOCKED",
+    },
+    "online": True,
+    "ozone": "OFF",
+    "primaryFiltration": {
+        "cycle": 1,
+        "duration": 4,
+        "lastUpdated": "2021-02-24T02:55:47.180Z",
+        "mode": "NORMAL",
+        "startHour": 2,
+        "status": "INACTIVE",
+    },
+    "pumps": [
+        {
+            "current": None,
+            "id": pump_id,
+            "speed": "ONE_SPEED",
+            "state": "OFF",
+            "type": pump_type,
+        }
+        for pump_id, pump_type in (
+            ("P1", "JET"),
+            ("P2", "JET"),
+            ("P3", "JET"),
+            ("CP", "CIRCULATION"),
+            ("BL", "BLOWER"),
+        )
+    ],
+    "secondaryFiltration": {
+        "lastUpdated": "2021-03-04T16:47:29.882Z",
+        "mode": "AWAY",
+        "status": "INACTIVE",
+    },
+    "sensors": [
+        {
+            "id": 13914100,
+            "spaId": "1",
+            "address": "C7:54:EE:BB:AA:AA",
+            "type": "ibs0x",
+            "name": "{cover-sensor-1}",
+            "subType": "magnet",
+            "voltage": 3.07,
+            "rssi": -56,
+            "age": 0,
+            "fill_drain": None,
+            "configState": '{"drainBit":0,"mode":null,"sensorSetTime":null}',
+            "motion": None,
+            "magnet": True,
+            "digital": None,
+            "button": False,
+            "triggeredCount": 18,
+            "missedCount": 0,
+            "snoozeUntil": "2025-02-17T19:19:38.879670Z",
+            "pressure": None,
+            "updatedAt": None,
+            "createdAt": "2025-02-17T19:19:38.879695Z",
+        }
+    ],
+    "setTemperature": 38.3,
+    "state": "NORMAL",
+    "time": "14:05:00",
+    "timeFormat": "HOURS_12",
+    "timeSet": None,
+    "timezone": None,
+    "uv": "OFF",
+    "uvOnDemand": "OFF",
+    "versions": {"balboa": "1.06", "controller": "1.28", "jacuzziLink": "53"},
+    "water": {
+        "oxidationReductionPotential": 604,
+        "ph": 7.01,
+        "temperature": 38.9,
+        "temperatureLastUpdated": "2021-03-07T22:04:15.686Z",
+        "turbidity": 0.01,
+    },
+    "watercare": None,
+}
+
+ENERGY_USAGE = {
+    "buckets": [
+        {"start": f"2021-03-{day:02d}", "kwh": 3.2 + day / 10, "cost": 0.42}
+        for day in range(1, 32)
+    ]
+}
+
+
+def full_status(**overrides):
+    status = copy.deepcopy(FULL_STATUS)
+    status.update(overrides)
+    return status
+
+
+def make_spa(spa_id="spa1"):
+    """A Spa which is not connected to the API"""
+    from smarttub import SmartTub, Spa
+
+    return Spa(SmartTub(), None, id=spa_id, brand="brand1", model="model1")
@@ -24,6 +24,9 @@ setuptools.setup(
         "pyjwt~=2.4",
         "python-dateutil~=2.8",
     ],
+    extras_require={
+        "speedups": ["orjson>=3.9"],
+    },
     # Note: tests require python >=3.8
     tests_require=[
         "pytest",
@@ -1 +1,7 @@
 from .api import *  # noqa: F401, F403
+from .cache import *  # noqa: F401, F403
+from .codec import *  # noqa: F401, F403
+from .credentials import *  # noqa: F401, F403
+from .fleet import *  # noqa: F401, F403
+from .ratelimit import *  # noqa: F401, F403
+from .retry import *  # noqa: F401, F403
@@ -1,85 +1,100 @@
 import argparse
 import asyncio
-import datetime
 import logging
 from pprint import pprint
 import sys
 
-import aiohttp
 
-from . import SmartTub, SpaLight
+from . import FileCredentialStore, SmartTub, SpaLight
 
 
 async def info_command(spas, args):
     for spa in spas:
         print(f"= Spa '{spa.name}' =\n")
-        if args.all or args.status or args.location or args.locks:
-            status = await spa.get_status_full()
 
-        if args.all or args.status:
+        include = []
+        if (
+            args.all
+            or args.status
+            or args.location
+            or args.pumps
+            or args.lights
+            or args.locks
+            or args.sensors
+        ):
+            include.append("status")
+        if args.all or args.errors:
+            include.append("errors")
+        if args.all or args.reminders:
+            include.append("reminders")
+        if args.all or args.energy:
+            include.append("energy_usage")
+        if args.all or args.debug:
+            include.append("debug_status")
+        snapshot = await spa.get_snapshot(include)
+        for section, error in snapshot.failures.items():
+            print(f"Failed to get {section}: {error}\n")
+        status = snapshot.status
+
+        if status and (args.all or args.status):
             print("== Status ==")
             status_dict = status.properties.copy()
             # redact location for privacy
-            location = status_dict.pop("location")
+            status_dict.pop("location")
             pprint(status_dict)
             print()
 
-        if args.location:
+        if status and args.location:
             # not included in --all
+            location = status.properties["location"]
             print(
                 f"Location: {location['latitude']} {location['longitude']} (accuracy: {location['accuracy']})\n"
             )
 
-        if args.all or args.pumps:
+        if status and (args.all or args.pumps):
             print("== Pumps ==")
             for pump in status.pumps:
                 print(pump)
             print()
 
-        if args.all or args.lights:
+        if status and (args.all or args.lights):
             print("== Lights ==")
             for light in status.lights:
                 print(light)
             print()
 
-        if args.all or args.errors:
+        if snapshot.errors is not None:
             print("== Errors ==")
-            for error in await spa.get_errors():
+            for error in snapshot.errors:
                 print(error)
             print()
 
-        if args.all or args.reminders:
+        if snapshot.reminders is not None:
             print("== Reminders ==")
-            for reminder in await spa.get_reminders():
+            for reminder in snapshot.reminders:
                 print(reminder)
             print()
 
-        if args.all or args.locks:
+        if status and (args.all or args.locks):
             print("== Locks ==")
             for lock in status.locks.values():
                 print(lock)
             print()
 
-        if args.all or args.energy:
+        if snapshot.energy_usage is not None:
             print("== Energy usage ==")
-            energy_usage_day = spa.get_energy_usage(
-                spa.EnergyUsageInterval.DAY,
-                end_date=datetime.date.today(),
-                start_date=datetime.date.today() - datetime.timedelta(days=7),
-            )
-            pprint(await energy_usage_day)
+            pprint(snapshot.energy_usage)
             print()
 
-        if args.all or args.sensors:
+        if status and (args.all or args.sensors):
             print("== Sensors ==")
             for sensor in status.sensors:
                 print(sensor)
             print()
 
-        if args.all or args.debug:
-            debug_status = await spa.get_debug_status()
+        if snapshot.debug_status is not None:
             print("== Debug status ==")
-            pprint(debug_status)
+            pprint(snapshot.debug_status)
             print()
 
 
@@ -139,6 +154,11 @@ async def main(argv):
     parser.add_argument(
         "-p", "--password", required=True, help="SmartTub account password"
     )
+    parser.add_argument(
+        "--token-cache",
+        metavar="PATH",
+        help="Reuse the access token stored in this file between invocations",
+    )
     parser.add_argument("-v", "--verbosity", action="count", default=0)
     subparsers = parser.add_subparsers()
 
@@ -193,8 +213,11 @@ async def main(argv):
 
     logging.basicConfig(level=log_level)
 
-    async with aiohttp.ClientSession() as session:
-        st = SmartTub(session)
+    credential_store = None
+    if args.token_cache:
+        credential_store = FileCredentialStore(args.token_cache)
+
+    async with SmartTub(credential_store=credential_store) as st:
         await st.login(args.username, args.password)
 
         account = await st.get_account()
@@ -1,54 +1,548 @@
 import asyncio
 import base64
+import collections
+import copy
 import datetime
 from enum import Enum
-import json
+import functools
+import hashlib
 import logging
+import operator
+import time
 from typing import List
+import weakref
 
 import aiohttp
 import dateutil.parser
+from dateutil.tz import tzutc
 from inflection import underscore
 
+from .cache import ResponseCache
+from .codec import JSONCodec, default_codec
+from .credentials import CredentialStore
+from .ratelimit import RateLimiter
+from .retry import CircuitBreaker, RetryPolicy, parse_retry_after
+
 logger = logging.getLogger(__name__)
 
 
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class _SingleFlight:
+    """Runs one call per key at a time, sharing its result with every caller
+
+    A caller which is cancelled does not cancel the shared call, unless it was
+    the last caller waiting for it: a call nobody waits for is cancelled, so
+    that it does not hold on to e.g. a connection.
+    """
+
+    def __init__(self):
+        self._calls: dict[object, _Flight] = {}
+
+    async def do(self, key, func):
+        flight = self._calls.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.create_task(func()))
+            self._calls[key] = flight
+            flight.task.add_done_callback(functools.partial(self._done, key, flight))
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                # every caller was cancelled; a new caller starts a new call
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    def _forget(self, key, flight: _Flight):
+        if self._calls.get(key) is flight:
+            del self._calls[key]
+
+    def _done(self, key, flight: _Flight, task: asyncio.Task):
+        self._forget(key, flight)
+        if not task.cancelled():
+            # retrieve the exception, in case every caller was cancelled
+            task.exception()
+
+
+class _Validated:
+    """A decoded response, with what is needed to tell if it has changed"""
+
+    __slots__ = ("etag", "last_modified", "digest", "value")
+
+    def __init__(self, etag, last_modified, digest, value):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.digest = digest
+        self.value = value
+
+
+def _coalesced(method):
+    """Share the result of a call with concurrent identical calls
+
+    The decorated object must have a _single_flight attribute.
+    """
+
+    @functools.wraps(method)
+    async def wrapper(self, *args):
+        return await self._single_flight.do(
+            (method.__name__, args), lambda: method(self, *args)
+        )
+
+    return wrapper
+
+
+class _StateWaiter:
+    __slots__ = ("check", "full", "deadline", "future")
+
+    def __init__(self, check, full, deadline, future):
+        self.check = check
+        self.full = full
+        self.deadline = deadline
+        self.future = future
+
+
+class _StateWatcher:
+    """Polls a spa's status on behalf of everything waiting for it to change
+
+    Polling starts when the first waiter arrives and stops once none are
+    left. The interval starts short and grows with each poll, and is reset
+    whenever a new waiter arrives (i.e. after each command).
+    """
+
+    INITIAL_INTERVAL = 0.25
+    MAX_INTERVAL = 2.0
+    BACKOFF = 1.5
+
+    def __init__(self, spa: "Spa"):
+        self.spa = spa
+        self._waiters: list[_StateWaiter] = []
+        self._task: asyncio.Task | None = None
+        self._interval = self.INITIAL_INTERVAL
+        self._wakeup = asyncio.Event()
+        self.polls = 0
+
+    async def wait(self, check, timeout: float, full: bool):
+        """Wait until check(state) is true, returning the state"""
+        waiter = _StateWaiter(
+            check,
+            full,
+            time.monotonic() + timeout,
+            asyncio.get_running_loop().create_future(),
+        )
+        self._waiters.append(waiter)
+        self._interval = self.INITIAL_INTERVAL
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        else:
+            self._wakeup.set()
+        # a cancelled waiter is dropped at the next poll
+        return await waiter.future
+
+    async def _run(self):
+        try:
+            while self._waiters:
+                await self._poll()
+                if self._waiters:
+                    await self._sleep(time.monotonic())
+        finally:
+            self._task = None
+
+    async def _poll(self):
+        # waiters which arrive during the poll are kept for the next one, as
+        # this state may predate their command
+        polled, self._waiters = self._waiters, []
+        self.polls += 1
+        try:
+            # bypass the response cache, which may hold the state from
+            # before the command for a while
+            if any(waiter.full for waiter in polled):
+                state = await self.spa._get_status_full(False)
+            else:
+                state = await self.spa._get_status(False)
+        except Exception as e:
+            for waiter in polled:
+                if not waiter.future.done():
+                    waiter.future.set_exception(e)
+            return
+
+        now = time.monotonic()
+        waiting = []
+        for waiter in polled:
+            if waiter.future.done():
+                continue
+            if waiter.check(state):
+                waiter.future.set_result(state)
+            elif now >= waiter.deadline:
+                waiter.future.set_exception(
+                    RuntimeError("State change not reflected within timeout period")
+                )
+            else:
+                waiting.append(waiter)
+        self._waiters = waiting + self._waiters
+
+    async def _sleep(self, polled_at: float):
+        """Sleep until the next poll is due, which a new waiter may bring
+        forward"""
+        interval = self._interval
+        self._interval = min(self.MAX_INTERVAL, self._interval * self.BACKOFF)
+        while True:
+            next_poll = polled_at + min(interval, self._interval)
+            next_poll = min(next_poll, min(waiter.deadline for waiter in self._waiters))
+            delay = next_poll - time.monotonic()
+            if delay <= 0:
+                return
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except TimeoutError:
+                return
+
+
+class _ConfigWrite:
+    __slots__ = ("method", "body", "check", "future")
+
+    def __init__(self, method, body, check, future):
+        self.method = method
+        self.body = body
+        self.check = check
+        self.future = future
+
+
+class _CommandQueue:
+    """Writes a spa's config one batch at a time
+
+    Writes submitted within DEBOUNCE seconds of each other are merged into one
+    request per method, later writes overriding earlier ones which set the
+    same keys. All the merged writes are then confirmed by a single wait for
+    the state to reflect them.
+    """
+
+    DEBOUNCE = 0.05
+
+    def __init__(self, spa: "Spa"):
+        self.spa = spa
+        self._pending: list[_ConfigWrite] = []
+        # the writes being sent or confirmed
+        self._writing: list[_ConfigWrite] = []
+        self._task: asyncio.Task | None = None
+
+    def touches(self, keys) -> bool:
+        """Whether a write waiting to be sent or confirmed sets any of keys"""
+        return any(
+            write.body.keys() & keys for write in (*self._pending, *self._writing)
+        )
+
+    async def submit(self, method: str, body: dict, check=None):
+        write = _ConfigWrite(
+            method, body, check, asyncio.get_running_loop().create_future()
+        )
+        self._pending.append(write)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return await write.future
+
+    async def _run(self):
+        try:
+            while self._pending:
+                await asyncio.sleep(self.DEBOUNCE)
+                writes, self._pending = self._pending, []
+                self._writing = [w for w in writes if not w.future.done()]
+                await self._flush(self._writing)
+                self._writing = []
+        finally:
+            self._writing = []
+            self._task = None
+
+    async def _flush(self, writes: list[_ConfigWrite]):
+        batches: dict[str, tuple[dict, list]] = {}
+        for write in writes:
+            body, batch_writes = batches.setdefault(write.method, ({}, []))
+            body.update(write.body)
+            batch_writes.append(write)
+
+        written = []
+        for method, (body, batch_writes) in batches.items():
+            try:
+                await self.spa.request(method, "config", body)
+            except Exception as e:
+                for write in batch_writes:
+                    if not write.future.done():
+                        write.future.set_exception(e)
+                continue
+            written.extend(batch_writes)
+
+        # a write overridden by a later one is confirmed by the later one
+        checks = []
+        for i, write in enumerate(written):
+            overridden = any(
+                later.method == write.method and later.body.keys() & write.body.keys()
+                for later in written[i + 1 :]
+            )
+            if write.check is not None and not overridden:
+                checks.append(write.check)
+        state = None
+        if checks:
+            try:
+                state = await self.spa._wait_for_state_change(
+                    lambda state: all(check(state) for check in checks)
+                )
+            except Exception as e:
+                for write in written:
+                    if not write.future.done():
+                        write.future.set_exception(e)
+                return
+        for write in written:
+            if not write.future.done():
+                write.future.set_result(state)
+
+
+class IdentityMap:
+    """Holds the one live object representing each account, spa and component
+
+    Objects are held weakly, so that they are forgotten once nothing else
+    refers to them. Keys are tuples starting with the kind of object, e.g.
+    ("Spa", spa_id) or ("SpaPump", spa_id, pump_id).
+    """
+
+    def __init__(self):
+        self._objects = weakref.WeakValueDictionary()
+
+    def __len__(self):
+        return len(self._objects)
+
+    def get(self, key):
+        return self._objects.get(key)
+
+    def set(self, key, obj):
+        """Make obj the object for key, replacing any other"""
+        self._objects[key] = obj
+
+    def update_or_create(self, key, factory, **properties):
+        """Return the object for key updated from properties, creating it
+        with factory(**properties) if there is none"""
+        obj = self._objects.get(key)
+        if obj is None:
+            obj = factory(**properties)
+            self._objects[key] = obj
+        else:
+            obj._update(**properties)
+        return obj
+
+
 class SmartTub:
     """Interface to the SmartTub API."""
 
     AUTH_URL = "https://api.smarttub.io/idp/signin"
     API_BASE = "https://api.smarttub.io"
 
-    def __init__(self, session: aiohttp.ClientSession = None):
-        self._session = session or aiohttp.ClientSession()
+    # re-authenticate this many seconds before the access token expires
+    TOKEN_REFRESH_MARGIN = 300
+
+    DEFAULT_RETRY_POLICY = RetryPolicy()
+
+    # the number of GET responses kept for conditional requests
+    VALIDATED_RESPONSES = 1024
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession = None,
+        *,
+        token_refresh_margin: float = TOKEN_REFRESH_MARGIN,
+        credential_store: CredentialStore | None = None,
+        connection_limit: int = 100,
+        connection_limit_per_host: int = 0,
+        keepalive_timeout: float = 60,
+        dns_cache_ttl: int | None = 300,
+        request_timeout: float | None = 30,
+        preconnect: int = 0,
+        json_codec: JSONCodec | None = None,
+        retry_policy: RetryPolicy | None = DEFAULT_RETRY_POLICY,
+        circuit_breaker: CircuitBreaker | bool = True,
+        rate_limiter: RateLimiter | None = None,
+        coalesce_requests: bool = True,
+        response_cache: ResponseCache | None = None,
+        conditional_requests: bool = True,
+    ):
+        """Create a SmartTub API client
+
+        The client can be used as an async context manager, which closes it on
+        exit. The connection pool settings only apply when no session is given,
+        in which case the client creates and owns its session.
+
+        session -- the aiohttp session to use (one is created if not given)
+        token_refresh_margin -- seconds before token expiry to re-authenticate
+        credential_store -- where to persist access tokens between sessions
+        connection_limit -- maximum number of open connections (0 for no limit)
+        connection_limit_per_host -- maximum connections per host (0 for no limit)
+        keepalive_timeout -- seconds to keep an idle connection open for reuse
+        dns_cache_ttl -- seconds to cache DNS lookups (None to cache forever)
+        request_timeout -- total timeout in seconds for each request
+        preconnect -- number of connections to open in advance at login
+        json_codec -- the JSON implementation to use (the fastest one installed
+            by default)
+        retry_policy -- how to retry failed requests (None to never retry)
+        circuit_breaker -- a CircuitBreaker, possibly shared with other clients,
+            True for a breaker of this client's own, or False for none
+        rate_limiter -- a RateLimiter, possibly shared with other clients, which
+            every request (including retries) must pass
+        coalesce_requests -- whether concurrent GETs of the same path share a
+            single request
+        response_cache -- a ResponseCache for GETs of spa resources
+        conditional_requests -- whether to revalidate GETs with ETag and
+            Last-Modified, returning the previous response if it is unchanged
+        """
+        self._session = session
+        self._owns_session = session is None
+        self._connector_options = {
+            "limit": connection_limit,
+            "limit_per_host": connection_limit_per_host,
+            "keepalive_timeout": keepalive_timeout,
+            "ttl_dns_cache": dns_cache_ttl,
+            "use_dns_cache": True,
+        }
+        self._request_timeout = request_timeout
+        self._preconnect = preconnect
+        self._pool_warmed = False
+        # requests in flight, so that close() can wait for them to finish
+        self._inflight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        # closing: no new requests are accepted, but those in flight may
+        # still use the session until closed
+        self._closing = False
+        self._closed = False
+        self._credential_store = credential_store
+        self._codec = json_codec or default_codec()
+        self._retry_policy = retry_policy
+        if circuit_breaker is True:
+            circuit_breaker = CircuitBreaker()
+        self._circuit_breaker = circuit_breaker or None
+        self._rate_limiter = rate_limiter
+        self._single_flight = _SingleFlight() if coalesce_requests else None
+        # one object per account, spa and component (see Spa._component())
+        self.identity_map = IdentityMap()
+        self._cache = response_cache
+        # background refreshes of stale cache entries
+        self._background: set[asyncio.Task] = set()
+        self._revalidating: set[str] = set()
+        self._validated: collections.OrderedDict[str, _Validated] | None = (
+            collections.OrderedDict() if conditional_requests else None
+        )
         self._access_token: str | None = None
         self._refresh_token: str | None = None
         self._id_token: str | None = None
-        self._token_expires_at: datetime.datetime | None = None
+        # expiry on the time.monotonic() clock, immune to wall clock changes
+        self._token_expires_at: float | None = None
+        self._token_refresh_margin = token_refresh_margin
+        # the single in-flight re-authentication shared by all callers
+        self._login_task: asyncio.Task | None = None
+        # the timer which starts re-authenticating before the token expires
+        self._refresh_handle: asyncio.TimerHandle | None = None
         self.account_id: str | None = None
         # Store credentials for re-authentication (no refresh endpoint available)
         self._username: str | None = None
         self._password: str | None = None
 
+    async def __aenter__(self) -> "SmartTub":
+        self._get_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._closed:
+            raise RuntimeError("SmartTub client is closed")
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(**self._connector_options),
+                timeout=aiohttp.ClientTimeout(total=self._request_timeout),
+            )
+        return self._session
+
+    async def close(self, timeout: float | None = 10) -> None:
+        """Stop accepting requests and release resources.
+
+        Requests already in flight are given up to timeout seconds to finish.
+        The session is closed only if it was created by this client.
+        """
+        if self._closing:
+            return
+        self._closing = True
+        if self._inflight:
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout)
+            except TimeoutError:
+                logger.warning(
+                    f"closing with {self._inflight} request(s) still in flight"
+                )
+        self._closed = True
+        if self._refresh_handle is not None:
+            self._refresh_handle.cancel()
+            self._refresh_handle = None
+        if self._login_task is not None and not self._login_task.done():
+            self._login_task.cancel()
+        for task in list(self._background):
+            task.cancel()
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+
+    async def _warm_pool(self):
+        """Open connections in advance so that the first requests reuse them"""
+
+        async def connect():
+            try:
+                async with self._get_session().head(self.API_BASE):
+                    pass
+            except (aiohttp.ClientError, TimeoutError) as e:
+                logger.debug(f"preconnect failed: {e}")
+
+        await asyncio.gather(*[connect() for _ in range(self._preconnect)])
+
     async def login(self, username: str, password: str) -> None:
         """Authenticate to SmartTub.
 
         This method must be called before any useful work can be done.
 
+        If a credential store was provided and holds a token for this user
+        which is still valid, it is reused and no request is made.
+
         username -- the email address for the SmartTub account
         password -- the password for the SmartTub account
         """
+        if self._load_stored_credentials(username):
+            self._username = username
+            self._password = password
+            logger.debug(f"using stored credentials, username={username}")
+        else:
+            await self._authenticate(username, password)
+        self._schedule_refresh()
+
+        if self._preconnect and not self._pool_warmed:
+            self._pool_warmed = True
+            await self._warm_pool()
+
+    async def _authenticate(self, username: str, password: str) -> None:
+        """Sign in to SmartTub with a username and password"""
         headers = {
             "Content-Type": "application/json",
             "Accept": "application/json",
         }
         body = {"username": username, "password": password}
 
-        async with self._session.post(
-            self.AUTH_URL, json=body, headers=headers
+        async with self._get_session().post(
+            self.AUTH_URL, data=self._codec.dumps(body), headers=headers
         ) as response:
             try:
-                data = await response.json()
+                data = self._codec.loads(await response.read())
             except Exception:
                 text = await response.text()
                 raise LoginFailed(f"Login failed: {response.status} - {text}")
@@ -74,13 +568,11 @@ class SmartTub:
                         # Fix Base64 padding
                         padded = payload_b64 + "=" * (-len(payload_b64) % 4)
                         decoded_bytes = base64.b64decode(padded)
-                        jwt_data = json.loads(decoded_bytes)
+                        jwt_data = self._codec.loads(decoded_bytes)
                         self.account_id = jwt_data.get("custom:account_id")
 
                 expires_in = token_data.get("expires_in", 86400)
-                self._token_expires_at = datetime.datetime.now() + datetime.timedelta(
-                    seconds=expires_in
-                )
+                self._token_expires_at = time.monotonic() + expires_in
 
                 # Store credentials for re-authentication when token expires
                 self._username = username
@@ -93,53 +585,362 @@ class SmartTub:
                     "Login successful but response format was unexpected"
                 ) from exc
 
+        self._save_stored_credentials(username, expires_in)
+
+    def _load_stored_credentials(self, username: str) -> bool:
+        """Adopt a stored token for username, if one is still valid"""
+        if self._credential_store is None:
+            return False
+        try:
+            stored = self._credential_store.load(username)
+        except OSError as e:
+            logger.warning(f"unable to load stored credentials: {e}")
+            return False
+        if not stored:
+            return False
+        try:
+            access_token = stored["access_token"]
+            account_id = stored["account_id"]
+            remaining = float(stored["expires_at"]) - time.time()
+        except (KeyError, TypeError, ValueError):
+            return False
+        if not access_token or remaining <= self._token_refresh_margin:
+            return False
+
+        self._access_token = access_token
+        self._refresh_token = None
+        self._id_token = None
+        self._token_expires_at = time.monotonic() + remaining
+        self.account_id = account_id
+        return True
+
+    def _save_stored_credentials(self, username: str, expires_in: float):
+        if self._credential_store is None:
+            return
+        try:
+            self._credential_store.save(
+                username,
+                {
+                    "access_token": self._access_token,
+                    "expires_at": time.time() + expires_in,
+                    "account_id": self.account_id,
+                },
+            )
+        except OSError as e:
+            logger.warning(f"unable to store credentials: {e}")
+
     @property
     def _headers(self):
         return {"Authorization": f"Bearer {self._access_token}"}
 
     async def _require_login(self):
-        """Ensure we have a valid access token, re-authenticating if needed."""
+        """Ensure we have a valid access token, re-authenticating if needed.
+
+        Once the token is within the refresh margin of its expiry, a
+        re-authentication is started in the background (by a timer set at
+        login, or by the first request to get here) and the current token
+        keeps being used. Only callers arriving after the token has actually
+        expired wait, and they all share a single login.
+        """
         if not self._access_token:
             raise RuntimeError("not logged in")
-        if self._token_expires_at and datetime.datetime.now() > self._token_expires_at:
-            # Token expired - re-authenticate using stored credentials
-            if self._username and self._password:
-                logger.debug("token expired, re-authenticating")
-                await self.login(self._username, self._password)
-            else:
+        if self._token_expires_at is None:
+            return
+        remaining = self._token_expires_at - time.monotonic()
+        if remaining > self._token_refresh_margin:
+            return
+        if not (self._username and self._password):
+            if remaining <= 0:
                 raise RuntimeError("token expired and no credentials available")
+            return
+        login_task = self._refresh_login()
+        if remaining <= 0:
+            # shield so that a cancelled caller does not abort the shared login
+            await asyncio.shield(login_task)
+
+    def _schedule_refresh(self):
+        """Re-authenticate once the token is within the refresh margin of its
+        expiry, whether or not any request is made by then"""
+        if self._refresh_handle is not None:
+            self._refresh_handle.cancel()
+            self._refresh_handle = None
+        if self._token_expires_at is None or not (self._username and self._password):
+            return
+        loop = asyncio.get_running_loop()
+        delay = self._token_expires_at - self._token_refresh_margin - time.monotonic()
+        self._refresh_handle = loop.call_at(
+            loop.time() + max(0.0, delay), self._refresh_due
+        )
 
-    async def request(self, method, path, body=None):
+    def _refresh_due(self):
+        self._refresh_handle = None
+        if not self._closing:
+            self._refresh_login()
+
+    def _refresh_login(self) -> asyncio.Task:
+        """Start re-authenticating, or join the re-authentication in flight."""
+        if self._login_task is None or self._login_task.done():
+            logger.debug("token expiring, re-authenticating")
+            self._login_task = asyncio.create_task(
+                self.login(self._username, self._password)
+            )
+            self._login_task.add_done_callback(self._login_task_done)
+        return self._login_task
+
+    async def _reauthenticate(self, rejected_token: str):
+        """Discard a token rejected by the API and log in again"""
+        if self._access_token == rejected_token:
+            if self._credential_store is not None:
+                try:
+                    self._credential_store.clear(self._username)
+                except OSError as e:
+                    logger.warning(f"unable to clear stored credentials: {e}")
+            self._token_expires_at = time.monotonic()
+            await asyncio.shield(self._refresh_login())
+        elif self._login_task is not None and not self._login_task.done():
+            await asyncio.shield(self._login_task)
+
+    @staticmethod
+    def _login_task_done(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"re-authentication failed: {task.exception()}")
+
+    async def request(
+        self, method, path, body=None, *, retry: bool | None = None, cache=True
+    ):
         """Generic method for making an authenticated request to the API
 
         This is used by resource objects associated with this API object
-        """
 
-        await self._require_login()
+        retry -- whether to retry this request if it fails; by default, the
+            retry policy decides based on the method
+        cache -- whether a GET may be answered from the response cache; if
+            not, the response is fetched (and stored in the cache)
 
-        r = await self._session.request(
-            method, f"{self.API_BASE}/{path}", headers=self._headers, json=body
+        Concurrent GETs of the same path are coalesced into a single request,
+        and every caller receives the same decoded response. If there is a
+        response cache, GETs may be answered from it, and other requests
+        which may change a spa invalidate it.
+        """
+
+        if self._closing:
+            raise RuntimeError("SmartTub client is closed")
+        self._inflight += 1
+        self._idle.clear()
+        try:
+            if method != "GET" or body is not None:
+                try:
+                    return await self._request(method, path, body, retry)
+                finally:
+                    if self._cache is not None and self._cache.changes(path):
+                        self._cache.invalidate(path)
+            if self._cache is not None and self._cache.ttl(path) is not None:
+                if not cache:
+                    return await self._fetch_into_cache(path, retry)
+                return await self._cached_get(path, retry)
+            return await self._get(path, retry)
+        finally:
+            self._inflight -= 1
+            if not self._inflight:
+                self._idle.set()
+
+    async def _get(self, path, retry):
+        if self._single_flight is None:
+            return await self._request("GET", path, None, retry)
+        return await self._single_flight.do(
+            path, lambda: self._request("GET", path, None, retry)
         )
 
+    async def _cached_get(self, path, retry):
+        cache = self._cache
+        entry = cache.get(path)
+        if entry is not None:
+            age = entry.age(time.monotonic())
+            if age < cache.ttl(path):
+                return entry.value
+            if cache.stale_while_revalidate:
+                self._revalidate(path, retry)
+                return entry.value
+
         try:
-            r.raise_for_status()
-        except aiohttp.ClientResponseError as e:
-            raise APIError(e)
+            return await self._fetch_into_cache(path, retry)
+        except (APIError, aiohttp.ClientError, TimeoutError) as e:
+            if entry is None or not cache.stale_while_revalidate:
+                raise
+            logger.warning(f"GET {path} failed, using cached response: {e}")
+            return entry.value
+
+    async def _fetch_into_cache(self, path, retry):
+        generation = self._cache.generation(path)
+        ret = await self._get(path, retry)
+        self._cache.set(path, ret, generation)
+        return ret
 
-        if int(r.headers["content-length"]) == 0:
-            ret = None
-        else:
-            ret = await r.json()
+    def _revalidate(self, path, retry):
+        """Refresh a stale cache entry in the background"""
+        if path in self._revalidating:
+            return
+
+        async def revalidate():
+            try:
+                await self._fetch_into_cache(path, retry)
+            except (APIError, aiohttp.ClientError, TimeoutError) as e:
+                logger.warning(f"GET {path} failed, keeping cached response: {e}")
+            finally:
+                self._revalidating.discard(path)
+
+        self._revalidating.add(path)
+        task = asyncio.create_task(revalidate())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _request(self, method, path, body, retry):
+        await self._require_login()
+        access_token = self._access_token
+
+        try:
+            ret = await self._send_with_retry(method, path, body, retry)
+        except APIError as e:
+            if e.status != 401 or not (self._username and self._password):
+                raise
+            # the token was rejected before it expired, e.g. a revoked token
+            # loaded from the credential store
+            await self._reauthenticate(access_token)
+            ret = await self._send_with_retry(method, path, body, retry)
 
         logger.debug(f"{method} {path} successful: {ret}")
 
         return ret
 
+    async def _send_with_retry(self, method, path, body, retry):
+        """Send a request, retrying according to the retry policy.
+
+        Each endpoint's failures are reported to the circuit breaker, and a
+        request to an endpoint whose circuit is open fails immediately with
+        CircuitOpen.
+        """
+        policy = self._retry_policy
+        if retry is None:
+            retry = policy is not None and policy.retries(method)
+        attempts = policy.attempts if retry and policy is not None else 1
+        breaker = self._circuit_breaker
+        endpoint = CircuitBreaker.endpoint(path)
+        delay = None
+
+        for attempt in range(1, attempts + 1):
+            if breaker is not None and not breaker.allow(endpoint):
+                raise CircuitOpen(f"{endpoint} is failing, not sending {method}")
+            if self._rate_limiter is not None:
+                await self._rate_limiter.acquire(self.account_id, path)
+            retry_after = None
+            try:
+                ret = await self._send(method, path, body)
+            except APIError as e:
+                if e.status is None or e.status < 500:
+                    # the API is up, the request itself was refused
+                    if breaker is not None:
+                        breaker.record_success(endpoint)
+                else:
+                    if breaker is not None:
+                        breaker.record_failure(endpoint)
+                if policy is None or e.status not in policy.statuses:
+                    raise
+                if attempt == attempts:
+                    raise
+                error = e
+                retry_after = parse_retry_after(e.headers.get("Retry-After"))
+            except (aiohttp.ClientConnectionError, TimeoutError) as e:
+                if breaker is not None:
+                    breaker.record_failure(endpoint)
+                if attempt == attempts:
+                    raise
+                error = e
+            else:
+                if breaker is not None:
+                    breaker.record_success(endpoint)
+                return ret
+
+            delay = policy.backoff(delay)
+            if retry_after is not None:
+                if retry_after > policy.max_delay:
+                    raise error
+                delay = max(delay, retry_after)
+            logger.debug(
+                f"{method} {path} failed ({error}), retry {attempt} in {delay:.2f}s"
+            )
+            await asyncio.sleep(delay)
+
+    async def _send(self, method, path, body):
+        """Make a single request to the API and decode the response.
+
+        The response is always released before returning, whether the body was
+        read, the request failed or the caller was cancelled, so that the
+        connection goes back to the pool (or is closed if it is unusable).
+
+        When a GET response is unchanged since the last one (the API answers a
+        conditional request with 304 Not Modified, or returns an identical
+        body), the previously decoded object is returned without decoding,
+        which lets callers reuse what they parsed from it.
+        """
+        headers = self._headers
+        data = None
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+            data = self._codec.dumps(body)
+
+        validated = None
+        if method == "GET" and self._validated is not None:
+            validated = self._validated.get(path)
+            if validated is not None:
+                self._validated.move_to_end(path)
+                if validated.etag is not None:
+                    headers["If-None-Match"] = validated.etag
+                if validated.last_modified is not None:
+                    headers["If-Modified-Since"] = validated.last_modified
+
+        async with self._get_session().request(
+            method, f"{self.API_BASE}/{path}", headers=headers, data=data
+        ) as r:
+            try:
+                r.raise_for_status()
+            except aiohttp.ClientResponseError as e:
+                raise APIError(e)
+            if r.status == 304 and validated is not None:
+                return validated.value
+            # read the whole body rather than trusting content-length, which
+            # is absent from chunked responses
+            content = await r.read()
+            etag = r.headers.get("ETag")
+            last_modified = r.headers.get("Last-Modified")
+
+        if method != "GET" or self._validated is None:
+            return self._decode(method, path, content)
+
+        digest = hashlib.blake2b(content, digest_size=16).digest()
+        if validated is not None and validated.digest == digest:
+            value = validated.value
+        else:
+            value = self._decode(method, path, content)
+        self._validated[path] = _Validated(etag, last_modified, digest, value)
+        while len(self._validated) > self.VALIDATED_RESPONSES:
+            self._validated.popitem(last=False)
+        return value
+
+    def _decode(self, method, path, content: bytes):
+        if not content:
+            return None
+        try:
+            return self._codec.loads(content)
+        except ValueError as e:
+            raise APIError(f"{method} {path} returned invalid JSON: {e}") from e
+
     async def get_account(self) -> "Account":
         """Retrieve the SmartTub account of the authenticated user"""
 
         j = await self.request("GET", f"accounts/{self.account_id}")
-        account = Account(self, **j)
+        account = self.identity_map.update_or_create(
+            ("Account", j["id"]), functools.partial(Account, self), **j
+        )
         logger.debug(f"get_account successful: {j}")
 
         return account
@@ -148,22 +949,52 @@ class SmartTub:
 class Account:
     def __init__(self, api: SmartTub, **properties):
         self._api = api
+        self._update(**properties)
+
+    def _update(self, **properties):
         self.id = properties["id"]
         self.email = properties["email"]
         self.properties = properties
 
-    async def get_spas(self):
-        return await asyncio.gather(
-            *[
-                self.get_spa(spa["id"])
-                for spa in (await self._api.request("GET", f"spas?ownerId={self.id}"))[
-                    "content"
-                ]
-            ]
+    def _spa(self, **properties) -> "Spa":
+        """Return the Spa with these properties, updating it if it exists"""
+        return self._api.identity_map.update_or_create(
+            ("Spa", properties["id"]),
+            functools.partial(Spa, self._api, self),
+            **properties,
         )
 
+    async def get_spas(self, prefetch_status: bool = False) -> List["Spa"]:
+        """Retrieve the spas belonging to this account
+
+        Spas are built from the listing when it has enough information, in
+        which case their properties only hold the summary from the listing
+        (details_loaded is False) until Spa.get_details() loads them in full.
+        Otherwise, each spa is retrieved individually.
+
+        prefetch_status -- also fetch each spa's full status (see
+            Spa.last_status), concurrently with the other spas
+        """
+        listing = await self._api.request("GET", f"spas?ownerId={self.id}")
+
+        async def load(spa_properties):
+            if all(key in spa_properties for key in Spa.SUMMARY_PROPERTIES):
+                spa = self._api.identity_map.get(("Spa", spa_properties["id"]))
+                if spa is None or not spa.details_loaded:
+                    spa = self._spa(**spa_properties)
+                    spa.details_loaded = False
+            else:
+                spa = await self.get_spa(spa_properties["id"])
+            if prefetch_status:
+                await spa.get_status_full()
+            return spa
+
+        return await asyncio.gather(*[load(spa) for spa in listing["content"]])
+
     async def get_spa(self, spa_id: str):
-        return Spa(self._api, self, **await self._api.request("GET", f"spas/{spa_id}"))
+        spa = self._spa(**await self._api.request("GET", f"spas/{spa_id}"))
+        spa.details_loaded = True
+        return spa
 
     def __str__(self):
         return f"<Account {self.email}>"
@@ -174,9 +1005,36 @@ class Spa:
     TemperatureFormat = Enum("TemperatureFormat", "FAHRENHEIT CELSIUS")
     EnergyUsageInterval = Enum("EnergyUsageInterval", "DAY MONTH")
 
+    # the properties needed to construct a Spa
+    SUMMARY_PROPERTIES = ("id", "brand", "model")
+    # how recent last_status must be to skip a config change it already has
+    FRESH_STATUS_AGE = 5.0
+
     def __init__(self, api: SmartTub, account: Account, **properties):
         self._api = api
         self.account = account
+        self._update(**properties)
+        # False while properties only hold the summary from the account's
+        # listing of spas, see get_details()
+        self.details_loaded = True
+        # the most recent state retrieved by get_status() or get_status_full()
+        # (including any PendingChanges not yet confirmed)
+        self.last_status: SpaState | None = None
+        # last_status as retrieved, and the changes applied on top of it
+        self._status: SpaState | None = None
+        self._pending_changes: list[PendingChange] = []
+        # concurrent calls of the getters share one request and one parse
+        self._single_flight = _SingleFlight()
+        # the last response to each getter and what was parsed from it
+        self._parsed: dict[str, tuple] = {}
+        # polls the status for _wait_for_state_change()
+        self._watcher = _StateWatcher(self)
+        # when _status was retrieved (monotonic time)
+        self._last_status_at: float | None = None
+        # merges and serializes config writes, see _configure()
+        self._commands = _CommandQueue(self)
+
+    def _update(self, **properties):
         self.id = properties["id"]
         self.brand = properties["brand"]
         self.model = properties["model"]
@@ -184,18 +1042,90 @@ class Spa:
 
         self.name = f"{self.brand} {self.model}"
 
-    async def request(self, method, resource: str, body=None):
-        return await self._api.request(method, f"spas/{self.id}/{resource}", body)
+    def _component(self, cls, key, **properties):
+        """Return the component of this spa with these properties
+
+        This is the canonical component if it has not changed. Otherwise it is
+        a new one, which replaces it: components are never changed in place,
+        as states share them (see SpaStateFull.from_previous()).
+        """
+        component = cls(self, **properties)
+        existing = self._api.identity_map.get((cls.__name__, self.id, key))
+        if existing is not None and existing._values() == component._values():
+            return existing
+        self._api.identity_map.set((cls.__name__, self.id, key), component)
+        return component
+
+    def _new_component(self, cls, key, **properties):
+        """Return a new component of this spa, replacing any existing one
+        as the canonical object"""
+        component = cls(self, **properties)
+        self._api.identity_map.set((cls.__name__, self.id, key), component)
+        return component
+
+    async def request(self, method, resource: str, body=None, *, cache=True):
+        path = f"spas/{self.id}/{resource}"
+        if cache:
+            return await self._api.request(method, path, body)
+        return await self._api.request(method, path, body, cache=False)
+
+    @_coalesced
+    async def get_details(self) -> dict:
+        """Return the spa's properties, retrieving them in full if necessary"""
+        if not self.details_loaded:
+            details = await self._api.request("GET", f"spas/{self.id}")
+            self._update(**{**self.properties, **details})
+            self.details_loaded = True
+        return self.properties
+
+    async def _get_parsed(self, resource: str, parse, cache=True):
+        """GET a resource and parse it, reusing the previous result if the API
+        returned the very same response object (i.e. it has not changed)"""
+        response = await self.request("GET", resource, cache=cache)
+        previous = self._parsed.get(resource)
+        if previous is not None and previous[0] is response:
+            return previous[1]
+        parsed = parse(response)
+        self._parsed[resource] = (response, parsed)
+        return parsed
+
+    def _changing(self) -> bool:
+        """Whether changes to the spa are waiting to be sent or confirmed"""
+        return bool(
+            self._commands._pending
+            or self._commands._task is not None
+            or self._watcher._waiters
+            or self._pending_changes
+        )
+
+    def _set_status(self, state: "SpaState"):
+        self._status = state
+        self._last_status_at = time.monotonic()
+        self._update_last_status()
+
+    def _update_last_status(self):
+        """Apply the pending changes to a copy of the retrieved status, or to
+        an empty state if none was retrieved yet"""
+        state = self._status
+        if self._pending_changes:
+            state = copy.copy(state) if state is not None else SpaState(self)
+            for change in self._pending_changes:
+                for name, value in change.values.items():
+                    setattr(state, name, value)
+        self.last_status = state
 
     async def _wait_for_state_change(
         self, check_func, timeout=10, get_status_method=None
     ):
         """Wait for a state change to be reflected in the API.
 
+        Concurrent waiters on a spa share one poll of its status, which is of
+        the full status if any of them asks for it.
+
         Args:
             check_func: A function that takes a SpaState and returns True if the desired state is reached
             timeout: Maximum time to wait in seconds
-            get_status_method: A method to call to get the current state if needed
+            get_status_method: get_status_full if the full state is needed
 
         Returns:
             The final SpaState after the change is complete
@@ -203,57 +1133,115 @@ class Spa:
         Raises:
             RuntimeError if the state change is not reflected within the timeout period
         """
-        start_time = datetime.datetime.now().timestamp()
-        # Use the provided method if available, otherwise use default get_status
-        status_method = get_status_method if get_status_method else self.get_status
-        while True:
-            state = await status_method()
-            if check_func(state):
-                return state
-
-            if datetime.datetime.now().timestamp() - start_time > timeout:
-                raise RuntimeError("State change not reflected within timeout period")
-
-            await asyncio.sleep(0.5)
+        full = get_status_method is not None and get_status_method != self.get_status
+        return await self._watcher.wait(check_func, timeout, full)
 
     async def get_status(self) -> "SpaState":
         """Query the status of the spa."""
-        return SpaState(self, **await self.request("GET", "status"))
+        return await self._get_status(True)
 
+    @_coalesced
+    async def _get_status(self, cache: bool) -> "SpaState":
+        state = await self._get_parsed("status", lambda j: SpaState(self, **j), cache)
+        self._set_status(state)
+        return state
+
+    @_coalesced
     async def get_pumps(self) -> List["SpaPump"]:
-        return [
-            SpaPump(self, **pump_info)
-            for pump_info in (await self.request("GET", "pumps"))["pumps"]
-        ]
+        return await self._get_parsed(
+            "pumps",
+            lambda j: [
+                self._component(SpaPump, pump_info["id"], **pump_info)
+                for pump_info in j["pumps"]
+            ],
+        )
 
+    @_coalesced
     async def get_lights(self) -> List["SpaLight"]:
-        return [
-            SpaLight(self, **light_info)
-            for light_info in (await self.request("GET", "lights"))["lights"]
-        ]
+        return await self._get_parsed(
+            "lights",
+            lambda j: [
+                self._component(SpaLight, light_info["zone"], **light_info)
+                for light_info in j["lights"]
+            ],
+        )
 
+    @_coalesced
     async def get_errors(self) -> List["SpaError"]:
-        return [
-            SpaError(self, **error_info)
-            for error_info in (await self.request("GET", "errors"))["content"]
-        ]
+        return await self._get_parsed(
+            "errors",
+            lambda j: [SpaError(self, **error_info) for error_info in j["content"]],
+        )
 
+    @_coalesced
     async def get_reminders(self) -> List["SpaReminder"]:
         # API returns both 'reminders' and 'filters', both seem to be identical
-        return [
-            SpaReminder(self, **reminder_info)
-            for reminder_info in (await self.request("GET", "reminders"))["reminders"]
-        ]
+        return await self._get_parsed(
+            "reminders",
+            lambda j: [
+                SpaReminder(self, **reminder_info) for reminder_info in j["reminders"]
+            ],
+        )
 
     async def get_status_full(self) -> "SpaStateFull":
         """Retrieves the state of lights and pumps in addition to what get_status does."""
-        full_status = await self.request("GET", "fullStatus")
-        try:
-            return SpaStateFull(self, full_status)
-        except Exception:
-            logger.error(f"Failed to parse fullStatus response: {full_status}")
-            raise
+        return await self._get_status_full(True)
+
+    @_coalesced
+    async def _get_status_full(self, cache: bool) -> "SpaStateFull":
+        previous = self._parsed.get("fullStatus")
+
+        def parse(full_status):
+            try:
+                if previous is not None:
+                    return SpaStateFull.from_previous(previous[1], full_status)
+                return SpaStateFull(self, full_status)
+            except Exception:
+                logger.error(f"Failed to parse fullStatus response: {full_status}")
+                raise
+
+        state = await self._get_parsed("fullStatus", parse, cache)
+        self._set_status(state)
+        return state
+
+    async def watch(self, fields=None, interval: float = 10.0):
+        """Poll the full status, yielding a StateChange for each field which
+        changes
 
+        Fields are named by their path in the fullStatus response, with pumps,
+        lights and sensors identified by their id, zone and address, e.g.
+        "heater", "water.temperature", "pumps.P1.state", "lights.1.mode" or
+        "locks.access".
+
+        fields -- the fields (or prefixes of fields, e.g. "pumps") to watch,
+            all by default
+        interval -- seconds between polls
+
+        The first poll only records the state, so changes are reported from
+        the second poll onwards.
+        """
+        if fields is not None:
+            fields = tuple(fields)
+        previous = None
+        values = None
+        while True:
+            state = await self.get_status_full()
+            if values is None:
+                values = _flatten_state(state.properties)
+            elif state is not previous and not _same_update_times(
+                previous.properties, state.properties
+            ):
+                new_values = _flatten_state(state.properties)
+                for field in {**values, **new_values}:
+                    old = values.get(field)
+                    new = new_values.get(field)
+                    if old != new and _field_matches(field, fields):
+                        yield StateChange(field, old, new)
+                values = new_values
+            previous = state
+            await asyncio.sleep(interval)
+
+    @_coalesced
     async def get_debug_status(self) -> dict:
         return (await self.request("GET", "debugStatus"))["debugStatus"]
 
@@ -270,30 +1258,150 @@ class Spa:
         }
         return (await self.request("POST", "energyUsage", body))["buckets"]
 
-    async def set_heat_mode(self, mode: HeatMode):
+    async def get_snapshot(
+        self,
+        include=None,
+        max_concurrency: int = 3,
+        energy_usage_interval: EnergyUsageInterval = EnergyUsageInterval.DAY,
+        energy_usage_start: datetime.date | None = None,
+        energy_usage_end: datetime.date | None = None,
+    ) -> "SpaSnapshot":
+        """Fetch several kinds of information about the spa concurrently.
+
+        A section which fails to load is recorded in the snapshot's failures
+        rather than failing the whole snapshot.
+
+        include -- the sections to fetch (see SpaSnapshot.SECTIONS), all of
+            them by default
+        max_concurrency -- the maximum number of requests in flight at once
+        energy_usage_interval -- the interval of the energy usage buckets
+        energy_usage_start -- the first day of energy usage (a week ago by
+            default)
+        energy_usage_end -- the last day of energy usage (today by default)
+        """
+        include = SpaSnapshot.SECTIONS if include is None else tuple(include)
+        unknown = set(include) - set(SpaSnapshot.SECTIONS)
+        if unknown:
+            raise ValueError(f"unknown snapshot sections: {', '.join(unknown)}")
+
+        end = energy_usage_end or datetime.date.today()
+        start = energy_usage_start or end - datetime.timedelta(days=7)
+        fetchers = {
+            "status": self.get_status_full,
+            "errors": self.get_errors,
+            "reminders": self.get_reminders,
+            "energy_usage": lambda: self.get_energy_usage(
+                energy_usage_interval, start_date=start, end_date=end
+            ),
+            "debug_status": self.get_debug_status,
+        }
+
+        snapshot = SpaSnapshot(self)
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def fetch(section):
+            async with semaphore:
+                try:
+                    setattr(snapshot, section, await fetchers[section]())
+                except Exception as e:
+                    logger.warning(f"{self}: failed to get {section}: {e}")
+                    snapshot.failures[section] = e
+
+        await asyncio.gather(*[fetch(section) for section in dict.fromkeys(include)])
+        return snapshot
+
+    async def _configure(
+        self, method: str, body: dict, check=None, optimistic_values=None
+    ):
+        """Change the spa's config, waiting until check(state) is true
+
+        Changes made at about the same time are merged into a single request
+        and confirmed together (see _CommandQueue). A change is not sent at
+        all if the status retrieved within the last FRESH_STATUS_AGE seconds
+        already satisfies check, and no earlier change to the same keys is
+        still to be sent or confirmed.
+
+        If optimistic_values are given, they are applied to last_status right
+        away, and a PendingChange is returned without waiting.
+        """
+        if optimistic_values is not None:
+            change = PendingChange(self, optimistic_values, body.keys())
+            change._start(self._write_config(method, body, check, change))
+            return change
+        await self._write_config(method, body, check)
+
+    async def _write_config(self, method, body, check, change=None):
+        """Submit a config change, unless it is already up to date (see
+        _configure()); change is the PendingChange it is made for, if any"""
+        keys = body.keys()
+        if (
+            check is not None
+            and self._status is not None
+            and time.monotonic() - self._last_status_at < self.FRESH_STATUS_AGE
+            and not self._commands.touches(keys)
+            and not any(
+                other is not change and other.keys & keys
+                for other in self._pending_changes
+            )
+            and check(self._status)
+        ):
+            logger.debug(f"{self}: config already up to date, not sending {body}")
+            return
+        await self._commands.submit(method, body, check)
+
+    async def set_heat_mode(self, mode: HeatMode, optimistic: bool = False):
+        """Set the heat mode
+
+        optimistic -- apply the change to last_status immediately, and return
+            a PendingChange instead of waiting for the spa to confirm it
+        """
         body = {"heatMode": mode.name}
-        await self.request("PATCH", "config", body)
-        await self._wait_for_state_change(lambda state: state.heat_mode == mode)
+        return await self._configure(
+            "PATCH",
+            body,
+            lambda state: state.heat_mode == mode,
+            optimistic_values={"heat_mode": mode} if optimistic else None,
+        )
 
-    async def set_temperature(self, temp_c: float):
+    async def set_temperature(self, temp_c: float, optimistic: bool = False):
+        """Set the target temperature
+
+        optimistic -- as for set_heat_mode()
+        """
         body = {
             # responds with 500 if given more than 1 decimal point
             "setTemperature": round(temp_c, 1)
         }
-        await self.request("PATCH", "config", body)
-        await self._wait_for_state_change(
-            lambda state: state.set_temperature == round(temp_c, 1)
+        return await self._configure(
+            "PATCH",
+            body,
+            lambda state: state.set_temperature == round(temp_c, 1),
+            optimistic_values=(
+                {"set_temperature": round(temp_c, 1)} if optimistic else None
+            ),
         )
 
     async def toggle_clearray(self):
         await self.request("POST", "clearray/toggle")
         # No need to wait for state change as this is a toggle operation
 
-    async def set_temperature_format(self, temperature_format: TemperatureFormat):
+    async def set_temperature_format(
+        self, temperature_format: TemperatureFormat, optimistic: bool = False
+    ):
+        """Set the temperature format shown on the spa's display
+
+        optimistic -- as for set_heat_mode()
+        """
         body = {"displayTemperatureFormat": temperature_format.name}
-        await self.request("POST", "config", body)
-        await self._wait_for_state_change(
-            lambda state: state.display_temperature_format == temperature_format.name
+        return await self._configure(
+            "POST",
+            body,
+            lambda state: state.display_temperature_format == temperature_format.name,
+            optimistic_values=(
+                {"display_temperature_format": temperature_format.name}
+                if optimistic
+                else None
+            ),
         )
 
     async def set_date_time(
@@ -316,139 +1424,485 @@ class Spa:
         return f"<Spa {self.id}>"
 
 
+class PendingChange:
+    """A change to a spa which is shown in Spa.last_status before the spa has
+    confirmed it
+
+    Await the change to wait for the confirmation. If the change fails or is
+    not confirmed in time, it is removed from last_status again (rolled back)
+    and awaiting it raises the error.
+    """
+
+    def __init__(self, spa: Spa, values: dict, keys=()):
+        self.spa = spa
+        # the SpaState attributes changed
+        self.values = values
+        # the config keys written
+        self.keys = frozenset(keys)
+        self._task: asyncio.Task | None = None
+
+    def _start(self, confirmation):
+        self.spa._pending_changes.append(self)
+        self.spa._update_last_status()
+        self._task = asyncio.create_task(confirmation)
+        self._task.add_done_callback(self._done)
+
+    def _done(self, task: asyncio.Task):
+        self.spa._pending_changes.remove(self)
+        self.spa._update_last_status()
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"{self}: rolled back: {task.exception()}")
+
+    def __await__(self):
+        return asyncio.shield(self._task).__await__()
+
+    def done(self) -> bool:
+        """Whether the change has been confirmed or rolled back"""
+        return self._task.done()
+
+    @property
+    def confirmed(self) -> bool:
+        return (
+            self._task.done()
+            and not self._task.cancelled()
+            and self._task.exception() is None
+        )
+
+    def __str__(self):
+        return f"<PendingChange {self.spa.id} {self.values}>"
+
+
+class StateChange:
+    """A field of a spa's status which changed, see Spa.watch()"""
+
+    __slots__ = ("field", "old", "new")
+
+    def __init__(self, field: str, old, new):
+        self.field = field
+        self.old = old
+        self.new = new
+
+    def __eq__(self, other):
+        if not isinstance(other, StateChange):
+            return NotImplemented
+        return (self.field, self.old, self.new) == (other.field, other.old, other.new)
+
+    def __repr__(self):
+        return f"<StateChange {self.field}: {self.old!r} -> {self.new!r}>"
+
+
+# the key identifying each item of the lists in a fullStatus response
+_STATE_LIST_KEYS = {"pumps": "id", "lights": "zone", "sensors": "address"}
+# fields which only record when the others changed
+_STATE_UPDATE_TIMES = ("lastUpdated", "fieldsLastUpdated")
+
+
+def _flatten_state(properties: dict, prefix: str = "") -> dict:
+    """Flatten a (full) status response into a map of field paths to values"""
+    values = {}
+    for key, value in properties.items():
+        if not prefix and key in _STATE_UPDATE_TIMES:
+            continue
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            values.update(_flatten_state(value, f"{path}."))
+        elif isinstance(value, list) and key in _STATE_LIST_KEYS:
+            item_key = _STATE_LIST_KEYS[key]
+            for item in value:
+                values.update(_flatten_state(item, f"{path}.{item[item_key]}."))
+        else:
+            values[path] = value
+    return values
+
+
+def _same_update_times(previous: dict, current: dict) -> bool:
+    """Whether a status response claims nothing changed since the previous"""
+    return all(
+        previous.get(key) is not None and previous.get(key) == current.get(key)
+        for key in _STATE_UPDATE_TIMES
+    )
+
+
+def _field_matches(field: str, fields) -> bool:
+    if fields is None:
+        return True
+    return any(field == f or field.startswith(f"{f}.") for f in fields)
+
+
+class SpaSnapshot:
+    """Information about a spa fetched at the same time by Spa.get_snapshot()
+
+    Sections which were not requested, or failed to load, are None. Failed
+    sections are listed in failures, with the exception which caused them.
+    """
+
+    SECTIONS = ("status", "errors", "reminders", "energy_usage", "debug_status")
+
+    def __init__(self, spa: Spa):
+        self.spa = spa
+        self.status: SpaStateFull | None = None
+        self.errors: list[SpaError] | None = None
+        self.reminders: list[SpaReminder] | None = None
+        self.energy_usage: list | None = None
+        self.debug_status: dict | None = None
+        self.failures: dict[str, Exception] = {}
+
+    @property
+    def complete(self) -> bool:
+        """Whether every requested section was fetched"""
+        return not self.failures
+
+    def __str__(self):
+        fetched = [s for s in self.SECTIONS if getattr(self, s) is not None]
+        return (
+            f"<SpaSnapshot {self.spa.id}: fetched={fetched}"
+            f" failed={list(self.failures)}>"
+        )
+
+
+# distinct timestamps kept by _parse_timestamp(): a spa's status has about 20
+_TIMESTAMP_CACHE_SIZE = 4096
+
+
+@functools.lru_cache(maxsize=_TIMESTAMP_CACHE_SIZE)
+def _parse_timestamp(value: str) -> datetime.datetime:
+    """Parse an ISO 8601 timestamp from the API, as dateutil.parser.isoparse()
+    would
+
+    The same timestamps recur from one poll to the next, so results are
+    cached. datetime.fromisoformat() is used where it gives the same result
+    (naive and UTC times), as it is much faster.
+    """
+    try:
+        parsed = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        return dateutil.parser.isoparse(value)
+    if parsed.tzinfo is None:
+        return parsed
+    if parsed.tzinfo is datetime.timezone.utc:
+        return parsed.replace(tzinfo=tzutc())
+    return dateutil.parser.isoparse(value)
+
+
+def _convert(func):
+    """A field converter which only needs the raw value"""
+    return lambda state, value: func(value)
+
+
+def _nested(class_name: str):
+    """A field converter which builds a SpaState subclass (which may not be
+    defined yet) from a nested object"""
+
+    def convert(state, value):
+        return globals()[class_name](state.spa, **value)
+
+    return convert
+
+
+def _convert_timestamps(state, value):
+    return {k: _parse_timestamp(v) if v is not None else None for k, v in value.items()}
+
+
+def _convert_locks(state, value):
+    """Build a state's locks without changing any existing SpaLock, which
+    other (possibly newer) states may share
+
+    An unchanged lock is the canonical one. A changed lock is a new object,
+    which only becomes canonical if state is the spa's latest (and was not
+    loaded by from_bytes()).
+    """
+    spa = state.spa
+    identity_map = spa._api.identity_map
+    latest = state is spa._status
+    locks = {}
+    for kind, lock_state in value.items():
+        lock = identity_map.get(("SpaLock", spa.id, kind))
+        if lock is not None and lock.state == lock_state:
+            pass
+        elif not state._detached and (lock is None or latest):
+            lock = spa._new_component(SpaLock, kind, kind=kind, state=lock_state)
+        else:
+            lock = SpaLock(spa, kind, lock_state)
+        locks[kind] = lock
+    return locks
+
+
+class _LazyField:
+    """A SpaState field which is converted when it is first read
+
+    The converted value is stored in the instance, which hides this
+    (non-data) descriptor from then on.
+    """
+
+    def __init__(self, key: str, attribute: str, converter):
+        self.key = key
+        self.attribute = attribute
+        self.converter = converter
+
+    def __get__(self, state, owner=None):
+        if state is None:
+            return self
+        value = state.properties.get(self.key)
+        if value is not None:
+            value = self.converter(state, value)
+        state.__dict__[self.attribute] = value
+        return value
+
+
+# serialized states start with a magic number and the version of the format
+_STATE_MAGIC = b"STS"
+_STATE_FORMAT_VERSION = 1
+_STATE_CODEC = default_codec()
+
+
 class SpaState:
+    """The state of a spa, or part of it, parsed from a status response
+
+    Subclasses declare their FIELDS: each one is either a JSON key, or a
+    (JSON key, converter) pair, where converter(state, value) converts a
+    non-null value. Each field is an attribute named after its key in
+    snake_case, which is None if the key is missing. FIELDS are compiled when
+    the class is defined: plain fields are copied from properties into a new
+    instance in a single pass, while converted fields are only converted when
+    they are first read.
+
+    A state can be serialized with to_bytes() (or to_dict()) and loaded again
+    with from_bytes(), e.g. to cache it or pass it to another process.
+    """
+
+    # every state class by name, for from_bytes()
+    _types: dict[str, type["SpaState"]] = {}
+    # set on states loaded by from_bytes(), see _load()
+    _detached = False
+
     CycleStatus = Enum("CycleStatus", "INACTIVE ACTIVE")
 
+    FIELDS = (
+        "ambientTemperature",
+        ("blowoutCycle", _convert(CycleStatus.__getitem__)),
+        ("cleanupCycle", _convert(CycleStatus.__getitem__)),
+        "current",
+        ("date", _convert(_parse_timestamp)),
+        "demoMode",
+        "dipSwitches",
+        "displayTemperatureFormat",
+        "error",
+        "errorCode",
+        ("fieldsLastUpdated", _convert_timestamps),
+        "flowSwitch",
+        ("heatMode", _convert(Spa.HeatMode.__getitem__)),
+        "heater",
+        "highTemperatureLimit",
+        ("lastUpdated", _convert(_parse_timestamp)),
+        "lights",  # seems to be None even when there are lights?
+        "location",
+        ("locks", _convert_locks),
+        "online",
+        "ozone",
+        ("primaryFiltration", _nested("SpaPrimaryFiltrationCycle")),
+        ("secondaryFiltration", _nested("SpaSecondaryFiltrationCycle")),
+        "setTemperature",
+        "state",
+        ("time", _convert(datetime.time.fromisoformat)),
+        "timeFormat",
+        "timeSet",  # ?
+        "timezone",  # ?
+        "uv",
+        "uvOnDemand",
+        "versions",
+        ("water", _nested("SpaWaterState")),
+        "watercare",
+    )
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        SpaState._types[cls.__name__] = cls
+        if "FIELDS" in cls.__dict__:
+            cls._compile_fields()
+
+    @classmethod
+    def _compile_fields(cls):
+        """Compile FIELDS into (JSON key, attribute) pairs for the plain
+        fields, and a _LazyField for each converted one"""
+        fields = []
+        lazy_fields = []
+        for field in cls.FIELDS:
+            key, converter = (field, None) if isinstance(field, str) else field
+            attribute = underscore(key)
+            if converter is None:
+                fields.append((key, attribute))
+            else:
+                setattr(cls, attribute, _LazyField(key, attribute, converter))
+                lazy_fields.append((key, attribute))
+        cls._fields = tuple(fields)
+        cls._lazy_fields = tuple(lazy_fields)
+
     def __init__(self, spa: Spa, **properties):
         self.spa = spa
-        self.properties = properties.copy()
-        self._prop("ambientTemperature")
-        self._prop("blowoutCycle", constructor=lambda x: self.CycleStatus[x])
-        self._prop("cleanupCycle", constructor=lambda x: self.CycleStatus[x])
-        self._prop("current")
-        self._prop("date", constructor=dateutil.parser.isoparse)
-        self._prop("demoMode")
-        self._prop("dipSwitches")
-        self._prop("displayTemperatureFormat")
-        self._prop("error")
-        self._prop("errorCode")
-        self._prop(
-            "fieldsLastUpdated",
-            constructor=lambda d: {
-                k: dateutil.parser.isoparse(v) if v is not None else None
-                for k, v in d.items()
-            },
-        )
-        self._prop("flowSwitch")
-        self._prop("heatMode", constructor=lambda x: Spa.HeatMode[x])
-        self._prop("heater")
-        self._prop("highTemperatureLimit")
-        self._prop("lastUpdated", constructor=dateutil.parser.isoparse)
-        self._prop("lights")  # seems to be None even when there are lights?
-        self._prop("location")
-        self._prop(
-            "locks",
-            constructor=lambda x: {
-                k: SpaLock(self.spa, kind=k, state=v) for k, v in x.items()
-            },
-        )
-        self._prop("online")
-        self._prop("ozone")
-        self._prop(
-            "primaryFiltration",
-            constructor=lambda p: SpaPrimaryFiltrationCycle(self.spa, **p),
-        )
-        self._prop(
-            "secondaryFiltration",
-            constructor=lambda p: SpaSecondaryFiltrationCycle(self.spa, **p),
+        self.properties = properties
+        self.__dict__.update(
+            {attribute: properties.get(key) for key, attribute in self._fields}
         )
-        self._prop("setTemperature")
-        self._prop("state")
-        self._prop("time", constructor=datetime.time.fromisoformat)
-        self._prop("timeFormat")
-        self._prop("timeSet")  # ?
-        self._prop("timezone")  # ?
-        self._prop("uv")
-        self._prop("uvOnDemand")
-        self._prop("versions")
-        self._prop("water", constructor=lambda p: SpaWaterState(self.spa, **p))
-        self._prop("watercare")
-
-    def _prop(
-        self,
-        json_key,
-        instance_variable_name=None,
-        constructor=None,
-    ):
-        """Set an instance variable corresponding to the specified JSON property
 
-        Arguments:
-            json_key -- a key in the self.properties map
-            instance_variable_name -- the name of the variable to set
-            constructor -- a callable which accepts the raw value as an argument, and returns an appropriate internal representation (e.g. enum)
+    @classmethod
+    def _load(cls, spa: Spa, properties: dict) -> "SpaState":
+        """Build a detached state: one which neither changes spa's canonical
+        components (see IdentityMap) nor becomes one of them"""
+        state = cls(spa, **properties)
+        state._detached = True
+        return state
+
+    def to_dict(self) -> dict:
+        """Return this state as a dict of JSON primitives
+
+        The state is as it was retrieved, without any optimistic changes, and
+        the dict shares its properties with it.
         """
+        return {
+            "version": _STATE_FORMAT_VERSION,
+            "type": self.__class__.__name__,
+            "spa": self.spa.id,
+            "properties": self.properties,
+        }
 
-        if instance_variable_name is None:
-            instance_variable_name = underscore(json_key)
-        if json_key in self.properties:
-            if constructor is None:
-                setattr(self, instance_variable_name, self.properties[json_key])
-            else:
-                # if value is None, skip constructor
-                if self.properties[json_key] is None:
-                    setattr(self, instance_variable_name, None)
-                else:
-                    setattr(
-                        self,
-                        instance_variable_name,
-                        constructor(self.properties[json_key]),
-                    )
-        else:
-            setattr(self, instance_variable_name, None)
+    def to_bytes(self) -> bytes:
+        """Serialize this state (see to_dict() and from_bytes())"""
+        return (
+            _STATE_MAGIC
+            + bytes([_STATE_FORMAT_VERSION])
+            + _STATE_CODEC.dumps(self.to_dict())
+        )
+
+    @classmethod
+    def from_dict(cls, data: dict, spa: Spa) -> "SpaState":
+        """Load a state returned by to_dict(), attaching it to spa
+
+        The state's components are its own: loading an old state does not
+        change the spa's current pumps, lights, sensors or locks.
+        """
+        if data.get("version") != _STATE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported state format: {data.get('version')}")
+        state_cls = SpaState._types.get(data["type"])
+        if state_cls is None or not issubclass(state_cls, cls):
+            raise ValueError(f"Not a {cls.__name__}: {data['type']}")
+        if data["spa"] != spa.id:
+            raise ValueError(f"State of spa {data['spa']}, not {spa.id}")
+        return state_cls._load(spa, data["properties"])
+
+    @classmethod
+    def from_bytes(cls, data: bytes, spa: Spa) -> "SpaState":
+        """Load a state serialized by to_bytes(), attaching it to spa
+
+        Raises ValueError if data is not a serialized state of spa.
+        """
+        header = len(_STATE_MAGIC) + 1
+        if data[: len(_STATE_MAGIC)] != _STATE_MAGIC or len(data) < header:
+            raise ValueError("Not a serialized SpaState")
+        if data[header - 1] != _STATE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported state format: {data[header - 1]}")
+        return cls.from_dict(_STATE_CODEC.loads(data[header:]), spa)
 
     def __str__(self):
         return f"<{self.__class__.__name__}: {self.properties}>"
 
 
+SpaState._compile_fields()
+SpaState._types["SpaState"] = SpaState
+
+
 class SpaStateFull(SpaState):
     def __init__(self, spa: Spa, state: dict):
         super().__init__(spa, **state)
-        self.lights = [
-            SpaLight(spa, **light_props)
-            for light_props in (self.properties.get("lights") or [])
-        ]
-        self.pumps = [
-            SpaPump(spa, **pump_props)
-            for pump_props in (self.properties.get("pumps") or [])
-        ]
-        self.sensors = [
-            SpaSensor(spa, **sensor_props)
-            for sensor_props in self.properties.get("sensors", [])
-        ]
+        self._build_components(None)
+
+    @classmethod
+    def _load(cls, spa: Spa, properties: dict) -> "SpaStateFull":
+        state = cls.__new__(cls)
+        SpaState.__init__(state, spa, **properties)
+        state._detached = True
+        state._build_components(None)
+        return state
+
+    @classmethod
+    def from_previous(cls, previous: "SpaStateFull", state: dict) -> "SpaStateFull":
+        """Build the state which followed previous, sharing whatever has not
+        changed with it
+
+        Converted fields (e.g. water or locks) and pumps, lights and sensors
+        whose part of the response is unchanged are the same objects as in
+        previous, so e.g. "new.pumps[0] is previous.pumps[0]" tells whether a
+        pump changed. Components which changed are new objects, which replace
+        the old ones as the spa's canonical objects (see IdentityMap); the old
+        ones, and so previous, are left as they were.
+        """
+        self = cls.__new__(cls)
+        SpaState.__init__(self, previous.spa, **state)
+        raw, converted = previous.properties, previous.__dict__
+        for key, attribute in cls._lazy_fields:
+            if attribute in converted and raw.get(key) == state.get(key):
+                self.__dict__[attribute] = converted[attribute]
+
+        # reuse the locks which did not change
+        locks = state.get("locks")
+        if "locks" not in self.__dict__ and converted.get("locks") and locks:
+            previous_locks = raw.get("locks") or {}
+            self.locks = {
+                kind: (
+                    converted["locks"][kind]
+                    if kind in converted["locks"] and previous_locks.get(kind) == value
+                    else self.spa._new_component(SpaLock, kind, kind=kind, state=value)
+                )
+                for kind, value in locks.items()
+            }
 
+        self._build_components(previous)
+        return self
+
+    def _build_components(self, previous: "SpaStateFull | None"):
+        self.lights = self._components("lights", SpaLight, "zone", previous)
+        self.pumps = self._components("pumps", SpaPump, "id", previous)
+        self.sensors = self._components("sensors", SpaSensor, "address", previous)
+
+    def _components(self, key: str, cls, item_key: str, previous):
+        items = self.properties.get(key) or []
+        if self._detached:
+            return [cls(self.spa, **item) for item in items]
+        if previous is None:
+            return [self.spa._component(cls, item[item_key], **item) for item in items]
+
+        reusable = {
+            item[item_key]: (item, component)
+            for item, component in zip(
+                previous.properties.get(key) or [], getattr(previous, key)
+            )
+        }
+        components = []
+        for item in items:
+            previous_item, component = reusable.get(item[item_key], (None, None))
+            if component is None or previous_item != item:
+                component = self.spa._new_component(cls, item[item_key], **item)
+            components.append(component)
+        return components
 
-class SpaWaterState(SpaState):
-    def __init__(self, spa: Spa, **properties):
-        self.spa = spa
-        self.properties = properties.copy()
 
-        self._prop("temperature")
-        self._prop("temperatureLastUpdated", constructor=dateutil.parser.isoparse)
+class SpaWaterState(SpaState):
+    FIELDS = (
+        "temperature",
+        ("temperatureLastUpdated", _convert(_parse_timestamp)),
+    )
 
 
 class SpaPrimaryFiltrationCycle(SpaState):
     PrimaryFiltrationMode = Enum("PrimaryFiltrationMode", "NORMAL NANO_MODE ECO_MODE")
 
-    def __init__(self, spa: Spa, **properties):
-        self.spa = spa
-        self.properties = properties.copy()
-
-        self._prop("cycle")
-        self._prop("duration")
-        self._prop("lastUpdated", constructor=dateutil.parser.isoparse)
-        self._prop("mode", constructor=lambda x: self.PrimaryFiltrationMode[x])
-        self._prop("startHour")
-        self._prop("status", constructor=lambda x: self.CycleStatus[x])
+    FIELDS = (
+        "cycle",
+        "duration",
+        ("lastUpdated", _convert(_parse_timestamp)),
+        ("mode", _convert(PrimaryFiltrationMode.__getitem__)),
+        "startHour",
+        ("status", _convert(SpaState.CycleStatus.__getitem__)),
+    )
 
     async def set(self, cycle=None, duration=None, mode=None, start_hour=None):
         body = {
@@ -459,7 +1913,7 @@ class SpaPrimaryFiltrationCycle(SpaState):
                 "startHour": start_hour if start_hour is not None else self.start_hour,
             }
         }
-        await self.spa.request("PATCH", "config", body)
+        await self.spa._configure("PATCH", body)
 
 
 class SpaSecondaryFiltrationCycle(SpaState):
@@ -467,30 +1921,66 @@ class SpaSecondaryFiltrationCycle(SpaState):
         "SecondaryFiltrationMode", "AWAY FREQUENT INFREQUENT"
     )
 
+    FIELDS = (
+        ("lastUpdated", _convert(_parse_timestamp)),
+        ("mode", _convert(SecondaryFiltrationMode.__getitem__)),
+        ("status", _convert(SpaState.CycleStatus.__getitem__)),
+    )
+
+    async def set_mode(self, mode: SecondaryFiltrationMode):
+        body = {"secondaryFiltrationConfig": mode.name}
+        await self.spa._configure("PATCH", body)
+
+
+class _Component:
+    """A part of a spa: a pump, light, sensor, lock, error or reminder
+
+    Components are slotted, as there are many of them when the states of many
+    spas are kept. The raw properties they are built from are only kept (as
+    properties) when KEEP_PROPERTIES is set, e.g. SpaPump.KEEP_PROPERTIES =
+    True; otherwise properties is None.
+    """
+
+    __slots__ = ("spa", "properties", "__weakref__")
+
+    KEEP_PROPERTIES = False
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        names = [
+            name
+            for klass in reversed(cls.__mro__[:-2])
+            for name in klass.__dict__.get("__slots__", ())
+        ]
+        cls._get_values = operator.attrgetter(*names) if names else lambda self: ()
+
     def __init__(self, spa: Spa, **properties):
         self.spa = spa
-        self.properties = properties.copy()
+        self._update(**properties)
 
-        self._prop("lastUpdated", constructor=dateutil.parser.isoparse)
-        self._prop("mode", constructor=lambda x: self.SecondaryFiltrationMode[x])
-        self._prop("status", constructor=lambda x: self.CycleStatus[x])
+    def _values(self) -> tuple:
+        """The component's attributes, other than spa and properties"""
+        return self._get_values(self)
+
+    def _update(self, **properties):
+        raise NotImplementedError
+
+    def _keep(self, properties: dict):
+        self.properties = properties if self.KEEP_PROPERTIES else None
 
-    async def set_mode(self, mode: SecondaryFiltrationMode):
-        body = {"secondaryFiltrationConfig": mode.name}
-        await self.spa.request("PATCH", "config", body)
 
+class SpaPump(_Component):
+    __slots__ = ("id", "speed", "state", "type")
 
-class SpaPump:
     PumpState = Enum("PumpState", "OFF LOW HIGH")
     PumpType = Enum("PumpType", "BLOWER CIRCULATION JET")
 
-    def __init__(self, spa: Spa, **properties):
-        self.spa = spa
+    def _update(self, **properties):
         self.id = properties["id"]
         self.speed = properties["speed"]
         self.state = self.PumpState[properties["state"]]
         self.type = self.PumpType[properties["type"]]
-        self.properties = properties
+        self._keep(properties)
 
     async def toggle(self):
         # For toggle, we need to wait for the state to change from its current state
@@ -509,14 +1999,24 @@ class SpaPump:
         return f"<SpaPump {self.id}: {self.type.name}={self.state.name}>"
 
 
-class SpaLight:
+class SpaLight(_Component):
+    __slots__ = (
+        "zone",
+        "red",
+        "green",
+        "blue",
+        "white",
+        "intensity",
+        "mode",
+        "cycleSpeed",
+    )
+
     LightMode = Enum(
         "LightMode",
         "PURPLE ORANGE RED YELLOW GREEN AQUA BLUE WHITE AMBER HIGH_SPEED_COLOR_WHEEL HIGH_SPEED_WHEEL LOW_SPEED_WHEEL FULL_DYNAMIC_RGB AUTO_TIMER_EXTERIOR PARTY COLOR_WHEEL OFF ON",
     )
 
-    def __init__(self, spa: Spa, **properties):
-        self.spa = spa
+    def _update(self, **properties):
         self.zone = properties["zone"]
 
         color = properties["color"]
@@ -528,7 +2028,7 @@ class SpaLight:
         self.intensity = properties["intensity"]
         self.mode = self.LightMode[properties["mode"]]
         self.cycleSpeed = properties.get("cycleSpeed", None)
-        self.properties = properties
+        self._keep(properties)
 
     async def set_mode(self, mode: LightMode, intensity: int):
         assert (intensity == 0) == (mode == self.LightMode.OFF)
@@ -554,9 +2054,10 @@ class SpaLight:
         return f"<SpaLight {self.zone}: {self.mode.name} {self.cycleSpeed} (R {self.red}/G {self.green}/B {self.blue}/W {self.white}) @ {self.intensity}>"
 
 
-class SpaReminder:
-    def __init__(self, spa: Spa, **properties):
-        self.spa = spa
+class SpaReminder(_Component):
+    __slots__ = ("id", "name", "remaining_days", "snoozed", "state", "last_updated")
+
+    def _update(self, **properties):
         self.id = properties["id"]
         self.name = properties["name"]
         self.remaining_days = properties["remainingDuration"]
@@ -566,7 +2067,8 @@ class SpaReminder:
 
         last_updated_str = properties.get("lastUpdated")
         if last_updated_str is not None:
-            self.last_updated = dateutil.parser.isoparse(last_updated_str)
+            self.last_updated = _parse_timestamp(last_updated_str)
+        self._keep(properties)
 
     async def snooze(self, days: int):
         body = {"remainingDuration": days}
@@ -580,28 +2082,43 @@ class SpaReminder:
         return f"<SpaReminder {self.id}: {self.state}/{self.remaining_days}/{self.snoozed}>"
 
 
-class SpaError:
-    def __init__(self, spa: Spa, **properties):
-        self.spa = spa
+class SpaError(_Component):
+    __slots__ = (
+        "code",
+        "title",
+        "description",
+        "created_at",
+        "updated_at",
+        "active",
+        "error_type",
+    )
+
+    def _update(self, **properties):
         self.code = properties["code"]
         self.title = properties["title"]
         self.description = properties["description"]
-        self.created_at = dateutil.parser.isoparse(properties["createdAt"])
-        self.updated_at = dateutil.parser.isoparse(properties["updatedAt"])
+        self.created_at = _parse_timestamp(properties["createdAt"])
+        self.updated_at = _parse_timestamp(properties["updatedAt"])
         self.active = properties["active"]
         self.error_type = properties["errorType"]
+        self._keep(properties)
 
     def __str__(self):
         return f"<SpaError {self.title}>"
 
 
-class SpaLock:
+class SpaLock(_Component):
+    __slots__ = ("kind", "state")
+
     CODE = "0772"
 
     def __init__(self, spa: Spa, kind: str, state: str):
-        self.spa = spa
+        super().__init__(spa, kind=kind, state=state)
+
+    def _update(self, kind: str, state: str):
         self.kind = kind
         self.state = state
+        self._keep({"kind": kind, "state": state} if self.KEEP_PROPERTIES else None)
 
     async def lock(self):
         if self.state != "LOCKED":
@@ -629,9 +2146,19 @@ class SpaLock:
         return f"<SpaLock {self.kind}: {self.state}>"
 
 
-class SpaSensor:
-    def __init__(self, spa: Spa, **properties):
-        self.spa = spa
+class SpaSensor(_Component):
+    __slots__ = (
+        "address",
+        "name",
+        "type",
+        "subType",
+        "magnet",
+        "pressure",
+        "motion",
+        "fill_drain",
+    )
+
+    def _update(self, **properties):
         self.address = properties["address"]
         self.name = properties["name"]
         self.type = properties["type"]
@@ -641,6 +2168,7 @@ class SpaSensor:
         self.pressure = properties["pressure"]
         self.motion = properties["motion"]
         self.fill_drain = properties["fill_drain"]
+        self._keep(properties)
 
     def __str__(self):
         return f"<SpaSensor {self.name} ({self.type})"
@@ -651,4 +2179,20 @@ class LoginFailed(RuntimeError):
 
 
 class APIError(RuntimeError):
-    pass
+    @property
+    def status(self) -> int | None:
+        """The HTTP status of the failed request, if the API responded"""
+        if self.args and isinstance(self.args[0], aiohttp.ClientResponseError):
+            return self.args[0].status
+        return None
+
+    @property
+    def headers(self):
+        """The headers of the failed response, if the API responded"""
+        if self.args and isinstance(self.args[0], aiohttp.ClientResponseError):
+            return self.args[0].headers or {}
+        return {}
+
+
+class CircuitOpen(APIError):
+    """The request was not sent because the endpoint keeps failing"""
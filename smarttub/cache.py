@@ -0,0 +1,115 @@
+import collections
+import re
+import time
+
+__all__ = ["ResponseCache"]
+
+_SPA_PATH = re.compile(r"^spas/([^/?]+)(?:/([^?]*))?")
+
+
+class _Entry:
+    __slots__ = ("value", "stored_at")
+
+    def __init__(self, value, stored_at: float):
+        self.value = value
+        self.stored_at = stored_at
+
+    def age(self, now: float) -> float:
+        return now - self.stored_at
+
+
+class ResponseCache:
+    """Caches responses to GETs of a spa's resources.
+
+    Each resource (the part of the path after spas/{id}/, e.g. "status" or
+    "fullStatus") is cached for its own time to live; resources without a TTL
+    are not cached. The least recently used entries are evicted once there
+    are more than max_entries.
+
+    Any other request under spas/{id}/ (i.e. a PATCH or POST which changes the
+    spa) invalidates all of that spa's entries, except for POSTs to the
+    READ_RESOURCES, which only retrieve data.
+
+    In stale-while-revalidate mode, an expired entry is returned immediately
+    while it is refreshed in the background, and it keeps being returned for
+    as long as the refresh fails.
+    """
+
+    DEFAULT_TTLS = {
+        "status": 5,
+        "fullStatus": 5,
+        "pumps": 30,
+        "lights": 30,
+        "errors": 60,
+        "reminders": 300,
+    }
+    # resources which are POSTed to, but do not change the spa
+    READ_RESOURCES = frozenset({"energyUsage"})
+
+    def __init__(
+        self,
+        ttls: dict[str, float] | None = None,
+        max_entries: int = 1024,
+        stale_while_revalidate: bool = False,
+    ):
+        """
+        ttls -- seconds to cache each resource for (DEFAULT_TTLS by default)
+        max_entries -- the maximum number of responses to keep
+        stale_while_revalidate -- whether to return expired responses while
+            they are refreshed
+        """
+        self.ttls = dict(self.DEFAULT_TTLS if ttls is None else ttls)
+        self.max_entries = max_entries
+        self.stale_while_revalidate = stale_while_revalidate
+        self._entries: collections.OrderedDict[str, _Entry] = collections.OrderedDict()
+        # bumped on each invalidation, so that a response fetched before a
+        # change is not stored after it
+        self._generations: dict[str, int] = collections.defaultdict(int)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def ttl(self, path: str) -> float | None:
+        """How long to cache the response to a GET of path, if at all"""
+        match = _SPA_PATH.match(path)
+        if match is None or not match.group(2):
+            return None
+        return self.ttls.get(match.group(2))
+
+    def changes(self, path: str) -> bool:
+        """Whether a request other than a GET of path may change the spa"""
+        match = _SPA_PATH.match(path)
+        return match is None or match.group(2) not in self.READ_RESOURCES
+
+    def generation(self, path: str) -> int:
+        match = _SPA_PATH.match(path)
+        return self._generations[match.group(1)] if match else 0
+
+    def get(self, path: str) -> _Entry | None:
+        entry = self._entries.get(path)
+        if entry is not None:
+            self._entries.move_to_end(path)
+        return entry
+
+    def set(self, path: str, value, generation: int | None = None):
+        """Store a response, unless the spa changed since generation"""
+        if generation is not None and generation != self.generation(path):
+            return
+        self._entries[path] = _Entry(value, time.monotonic())
+        self._entries.move_to_end(path)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, path: str):
+        """Forget the responses for the spa which path belongs to"""
+        match = _SPA_PATH.match(path)
+        if match is None:
+            return
+        spa_id = match.group(1)
+        self._generations[spa_id] += 1
+        prefix = f"spas/{spa_id}/"
+        for cached_path in [p for p in self._entries if p.startswith(prefix)]:
+            del self._entries[cached_path]
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,93 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+__all__ = [
+    "JSONCodec",
+    "StdlibJSONCodec",
+    "OrjsonCodec",
+    "MsgspecCodec",
+    "default_codec",
+]
+
+
+class JSONCodec:
+    """Encodes request bodies and decodes API responses.
+
+    Subclasses must raise ValueError (or a subclass) from loads() when the
+    input is not valid JSON.
+    """
+
+    name = None
+
+    def dumps(self, obj) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, data: bytes | str):
+        raise NotImplementedError
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__}>"
+
+
+class StdlibJSONCodec(JSONCodec):
+    """The json module from the standard library"""
+
+    name = "json"
+
+    def dumps(self, obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+    def loads(self, data: bytes | str):
+        return json.loads(data)
+
+
+class OrjsonCodec(JSONCodec):
+    """orjson (https://github.com/ijl/orjson)"""
+
+    name = "orjson"
+
+    def __init__(self):
+        if orjson is None:
+            raise RuntimeError("orjson is not installed")
+
+    def dumps(self, obj) -> bytes:
+        return orjson.dumps(obj)
+
+    def loads(self, data: bytes | str):
+        return orjson.loads(data)
+
+
+class MsgspecCodec(JSONCodec):
+    """msgspec (https://github.com/jcrist/msgspec)"""
+
+    name = "msgspec"
+
+    def __init__(self):
+        if msgspec is None:
+            raise RuntimeError("msgspec is not installed")
+        self._encoder = msgspec.json.Encoder()
+        self._decoder = msgspec.json.Decoder()
+
+    def dumps(self, obj) -> bytes:
+        return self._encoder.encode(obj)
+
+    def loads(self, data: bytes | str):
+        return self._decoder.decode(data)
+
+
+def default_codec() -> JSONCodec:
+    """Return the fastest codec available: orjson, msgspec, then json"""
+    if orjson is not None:
+        return OrjsonCodec()
+    if msgspec is not None:
+        return MsgspecCodec()
+    return StdlibJSONCodec()
@@ -0,0 +1,107 @@
+import json
+import logging
+import os
+import pathlib
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["CredentialStore", "MemoryCredentialStore", "FileCredentialStore"]
+
+
+class CredentialStore:
+    """Persists SmartTub access tokens so that a login can be reused.
+
+    Entries are keyed by username and hold the access token, its expiry (as a
+    UNIX timestamp) and the account id, e.g.:
+
+        {"access_token": "...", "expires_at": 1700000000.0, "account_id": "..."}
+
+    Passwords are never stored.
+    """
+
+    def load(self, username: str) -> dict | None:
+        """Return the stored credentials for username, or None"""
+        raise NotImplementedError
+
+    def save(self, username: str, credentials: dict) -> None:
+        """Store credentials for username, replacing any previous entry"""
+        raise NotImplementedError
+
+    def clear(self, username: str) -> None:
+        """Forget the stored credentials for username, if any"""
+        raise NotImplementedError
+
+
+class MemoryCredentialStore(CredentialStore):
+    """Keeps credentials for the lifetime of the process.
+
+    Useful for sharing one login between several SmartTub instances.
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    def load(self, username: str) -> dict | None:
+        entry = self._entries.get(username)
+        return dict(entry) if entry is not None else None
+
+    def save(self, username: str, credentials: dict) -> None:
+        self._entries[username] = dict(credentials)
+
+    def clear(self, username: str) -> None:
+        self._entries.pop(username, None)
+
+
+class FileCredentialStore(CredentialStore):
+    """Keeps credentials in a JSON file, readable only by the current user.
+
+    The file is replaced atomically on every write, so that concurrent
+    processes sharing it never observe a partial file.
+    """
+
+    def __init__(self, path):
+        self.path = pathlib.Path(path).expanduser()
+        self._lock = threading.Lock()
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            logger.warning(f"ignoring corrupt credential file {self.path}")
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def _write(self, data: dict):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(
+            dir=self.path.parent, prefix=f".{self.path.name}.", suffix=".tmp"
+        )
+        try:
+            os.chmod(tmp_path, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def load(self, username: str) -> dict | None:
+        with self._lock:
+            return self._read().get(username)
+
+    def save(self, username: str, credentials: dict) -> None:
+        with self._lock:
+            data = self._read()
+            data[username] = dict(credentials)
+            self._write(data)
+
+    def clear(self, username: str) -> None:
+        with self._lock:
+            data = self._read()
+            if data.pop(username, None) is not None:
+                self._write(data)
@@ -0,0 +1,298 @@
+import asyncio
+import heapq
+import inspect
+import itertools
+import logging
+import random
+import time
+
+from .api import SmartTub, Spa, SpaPump, SpaState, SpaStateFull
+from .ratelimit import WaitStats
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["AdaptiveInterval", "FleetPoller", "PollResult"]
+
+
+class PollResult:
+    """The outcome of one poll of a spa's full status by a FleetPoller"""
+
+    __slots__ = ("spa", "state", "error", "lag")
+
+    def __init__(
+        self,
+        spa: Spa,
+        state: SpaStateFull | None,
+        error: Exception | None,
+        lag: float,
+    ):
+        self.spa = spa
+        self.state = state
+        self.error = error
+        # seconds between when the poll was due and when it started
+        self.lag = lag
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __str__(self):
+        outcome = "ok" if self.ok else f"error={self.error!r}"
+        return f"<PollResult {self.spa.id} {outcome} lag={self.lag:.3f}s>"
+
+
+class AdaptiveInterval:
+    """Chooses how long to wait before polling a spa again, from its state.
+
+    A spa which is active (heating, running a jet pump or blower, or in a
+    cleanup, blowout or filtration cycle) is polled every active seconds, and
+    an idle one every idle seconds. An idle spa is polled again when its
+    primary filtration cycle is due to start or stop, according to the spa's
+    clock. A spa which is offline is polled less and less often: idle seconds
+    after the first offline poll, doubling up to offline_max.
+    """
+
+    def __init__(
+        self, active: float = 10.0, idle: float = 300.0, offline_max: float = 3600.0
+    ):
+        self.active = active
+        self.idle = idle
+        self.offline_max = offline_max
+
+    def is_active(self, state: SpaState) -> bool:
+        if getattr(state, "heater", None) == "ON":
+            return True
+        for cycle in ("cleanup_cycle", "blowout_cycle"):
+            if getattr(state, cycle, None) == SpaState.CycleStatus.ACTIVE:
+                return True
+        filtration = getattr(state, "primary_filtration", None)
+        if getattr(filtration, "status", None) == SpaState.CycleStatus.ACTIVE:
+            return True
+        # circulation pumps may run around the clock
+        return any(
+            pump.state != SpaPump.PumpState.OFF
+            and pump.type != SpaPump.PumpType.CIRCULATION
+            for pump in getattr(state, "pumps", None) or []
+        )
+
+    def until_filtration_change(self, state: SpaState) -> float | None:
+        """Seconds until the primary filtration cycle is due to start or stop,
+        or None if that cannot be predicted"""
+        filtration = getattr(state, "primary_filtration", None)
+        start_hour = getattr(filtration, "start_hour", None)
+        duration = getattr(filtration, "duration", None)
+        spa_time = getattr(state, "time", None)
+        if start_hour is None or not duration or spa_time is None:
+            return None
+        day = 24 * 3600
+        now = spa_time.hour * 3600 + spa_time.minute * 60 + spa_time.second
+        start = start_hour * 3600
+        return min(
+            (transition - now) % day or day
+            for transition in (start, start + duration * 3600)
+        )
+
+    def interval(self, state: SpaState, offline_polls: int = 0) -> float:
+        """Seconds until the next poll
+
+        offline_polls -- the number of consecutive polls (including this one)
+            which found the spa offline
+        """
+        if offline_polls:
+            return min(self.offline_max, self.idle * 2 ** (offline_polls - 1))
+        if self.is_active(state):
+            return self.active
+        until_change = self.until_filtration_change(state)
+        if until_change is not None and until_change < self.idle:
+            # poll just after the change
+            return max(self.active, until_change + 1)
+        return self.idle
+
+
+class _Scheduled:
+    __slots__ = ("spa", "interval", "offline_polls", "removed")
+
+    def __init__(self, spa: Spa, interval: float):
+        self.spa = spa
+        self.interval = interval
+        self.offline_polls = 0
+        self.removed = False
+
+
+class FleetPoller:
+    """Polls the full status of many spas, across any number of accounts.
+
+    Each spa is polled every interval seconds, give or take jitter (a fraction
+    of the interval), and the first polls are spread over the first interval,
+    so that spas added together are not polled together. At most
+    max_concurrency polls run at once; when more are due, spas with changes
+    waiting to be confirmed are polled first.
+
+    With an interval_policy (e.g. AdaptiveInterval), each spa's interval is
+    chosen after each poll from the state it returned.
+
+    Each PollResult is passed to callback (which may be a coroutine function)
+    and/or put on queue. lag_stats records how late polls start compared to
+    their schedule, and backlog how many polls are due but not yet started:
+    both grow when the poller cannot keep up.
+    """
+
+    def __init__(
+        self,
+        callback=None,
+        *,
+        queue: asyncio.Queue | None = None,
+        interval: float = 30.0,
+        jitter: float = 0.1,
+        max_concurrency: int = 10,
+        interval_policy: AdaptiveInterval | None = None,
+    ):
+        """
+        callback -- called with each PollResult
+        queue -- an asyncio.Queue to put each PollResult on
+        interval -- the default seconds between polls of each spa
+        jitter -- the fraction of the interval by which polls vary at random
+        max_concurrency -- the maximum number of polls in progress
+        interval_policy -- chooses each spa's interval from its state
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.callback = callback
+        self.queue = queue
+        self.interval = interval
+        self.jitter = jitter
+        self.max_concurrency = max_concurrency
+        self.interval_policy = interval_policy
+        self.lag_stats = WaitStats()
+
+        self._spas: dict[str, _Scheduled] = {}
+        # (due, sequence, entry), by when the poll is due
+        self._schedule: list[tuple] = []
+        # (priority, due, sequence, entry), for polls which are due
+        self._ready: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._sequence = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+
+    def __len__(self):
+        return len(self._spas)
+
+    @property
+    def backlog(self) -> int:
+        """The number of polls which are due but have not started"""
+        return self._ready.qsize()
+
+    async def add_account(self, api: SmartTub, interval: float | None = None):
+        """Poll all the spas of the account api is logged in to"""
+        account = await api.get_account()
+        spas = await account.get_spas()
+        for spa in spas:
+            self.add_spa(spa, interval)
+        return spas
+
+    def add_spa(self, spa: Spa, interval: float | None = None):
+        """Poll a spa every interval seconds (the poller's default if None)"""
+        if interval is None:
+            interval = self.interval
+        entry = self._spas.get(spa.id)
+        if entry is not None:
+            entry.interval = interval
+            return
+        entry = self._spas[spa.id] = _Scheduled(spa, interval)
+        self._schedule_poll(entry, time.monotonic() + random.uniform(0, interval))
+
+    def remove_spa(self, spa: Spa):
+        entry = self._spas.pop(spa.id, None)
+        if entry is not None:
+            entry.removed = True
+
+    def _schedule_poll(self, entry: _Scheduled, due: float):
+        heapq.heappush(self._schedule, (due, next(self._sequence), entry))
+        self._wakeup.set()
+
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks.append(asyncio.create_task(self._run_schedule()))
+        for _ in range(self.max_concurrency):
+            self._tasks.append(asyncio.create_task(self._run_worker()))
+
+    async def stop(self):
+        """Stop polling, cancelling polls in progress"""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    async def _run_schedule(self):
+        while True:
+            now = time.monotonic()
+            while self._schedule and self._schedule[0][0] <= now:
+                due, sequence, entry = heapq.heappop(self._schedule)
+                if entry.removed:
+                    continue
+                priority = 0 if entry.spa._changing() else 1
+                self._ready.put_nowait((priority, due, sequence, entry))
+
+            self._wakeup.clear()
+            delay = self._schedule[0][0] - now if self._schedule else None
+            try:
+                async with asyncio.timeout(delay):
+                    await self._wakeup.wait()
+            except TimeoutError:
+                pass
+
+    async def _run_worker(self):
+        while True:
+            _, due, _, entry = await self._ready.get()
+            if entry.removed:
+                continue
+            started = time.monotonic()
+            lag = max(0.0, started - due)
+            self.lag_stats.record(lag)
+            try:
+                state = await entry.spa.get_status_full()
+                result = PollResult(entry.spa, state, None, lag)
+                if self.interval_policy is not None:
+                    if state.online is False:
+                        entry.offline_polls += 1
+                    else:
+                        entry.offline_polls = 0
+                    entry.interval = self.interval_policy.interval(
+                        state, entry.offline_polls
+                    )
+            except asyncio.CancelledError:
+                # stopped during the poll, which is made again once restarted
+                if not entry.removed:
+                    self._schedule_poll(entry, due)
+                raise
+            except Exception as e:
+                logger.warning(f"failed to poll {entry.spa}: {e}")
+                result = PollResult(entry.spa, None, e, lag)
+
+            if not entry.removed:
+                interval = entry.interval * (
+                    1 + random.uniform(-self.jitter, self.jitter)
+                )
+                # a spa which fell behind is polled as soon as possible, but
+                # does not catch up on the polls it missed
+                self._schedule_poll(entry, max(due + interval, time.monotonic()))
+            await self._deliver(result)
+
+    async def _deliver(self, result: PollResult):
+        if self.callback is not None:
+            try:
+                ret = self.callback(result)
+                if inspect.isawaitable(ret):
+                    await ret
+            except Exception:
+                logger.exception(f"FleetPoller callback failed for {result}")
+        if self.queue is not None:
+            await self.queue.put(result)
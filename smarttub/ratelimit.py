@@ -0,0 +1,244 @@
+import asyncio
+import collections
+import re
+import time
+
+__all__ = ["TokenBucket", "RateLimiter", "WaitStats"]
+
+_SPA_PATH = re.compile(r"^spas/([^/?]+)/")
+
+
+class TokenBucket:
+    """Allows rate requests per second on average, in bursts of up to burst"""
+
+    def __init__(self, rate: float, burst: float | None = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if now > self._updated:
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available (0 if one is available now)"""
+        self._refill(now)
+        # tolerate floating point error in the refill arithmetic
+        if self._tokens >= 1 - 1e-9:
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self._tokens -= 1
+
+
+class WaitStats:
+    """How long requests waited in the rate limiter's queue"""
+
+    def __init__(self):
+        self.count = 0
+        self.delayed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float):
+        self.count += 1
+        if wait > 0:
+            self.delayed += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    @property
+    def mean_wait(self) -> float:
+        return self.total_wait / self.count if self.count else 0.0
+
+    def __str__(self):
+        return (
+            f"<WaitStats count={self.count} delayed={self.delayed}"
+            f" mean={self.mean_wait:.3f}s max={self.max_wait:.3f}s>"
+        )
+
+
+class _Waiter:
+    __slots__ = ("future", "buckets", "enqueued")
+
+    def __init__(self, future, buckets, enqueued):
+        self.future = future
+        self.buckets = buckets
+        self.enqueued = enqueued
+
+
+class RateLimiter:
+    """Limits the rate of requests made by one or more SmartTub clients.
+
+    Limits may be set globally, per account and per spa; a request must fit
+    within all of the limits which apply to it. Requests to a spa's resources
+    (spas/{id}/...) form one flow per spa, and other requests one flow per
+    account. When requests have to wait, flows take turns in proportion to
+    their weight (weighted fair queuing), so a single busy flow cannot starve
+    the others.
+
+    Pass the same RateLimiter to several SmartTub instances to share limits
+    between them.
+    """
+
+    def __init__(
+        self,
+        rate: float | None = None,
+        burst: float | None = None,
+        *,
+        account_rate: float | None = None,
+        account_burst: float | None = None,
+        spa_rate: float | None = None,
+        spa_burst: float | None = None,
+        weights: dict[str, float] | None = None,
+    ):
+        """
+        rate, burst -- the limit on all requests
+        account_rate, account_burst -- the limit on each account's requests
+        spa_rate, spa_burst -- the limit on requests for each spa
+        weights -- relative share of each flow (see flow()), 1 by default
+        """
+        self._global = TokenBucket(rate, burst) if rate else None
+        self._account_limit = (account_rate, account_burst) if account_rate else None
+        self._spa_limit = (spa_rate, spa_burst) if spa_rate else None
+        self._account_buckets: dict[str, TokenBucket] = {}
+        self._spa_buckets: dict[str, TokenBucket] = {}
+        self.weights = dict(weights or {})
+
+        self._queues: dict[str, collections.deque] = {}
+        self._waiting = 0
+        # start-time fair queuing: each active flow is tagged with the virtual
+        # start time of its next request, and the lowest tag is served first
+        self._virtual_time = 0.0
+        self._start_tags: dict[str, float] = {}
+        self._finish_tags: dict[str, float] = {}
+        self._wakeup = asyncio.Event()
+        self._dispatcher: asyncio.Task | None = None
+
+        self.stats = WaitStats()
+        self.flow_stats: dict[str, WaitStats] = collections.defaultdict(WaitStats)
+
+    @staticmethod
+    def flow(account_id: str | None, path: str) -> str:
+        """The name of the flow a request belongs to"""
+        match = _SPA_PATH.match(path)
+        if match:
+            return f"spa:{match.group(1)}"
+        return f"account:{account_id}"
+
+    def _buckets(self, account_id: str | None, path: str) -> list[TokenBucket]:
+        buckets = []
+        if self._global is not None:
+            buckets.append(self._global)
+        if self._account_limit is not None:
+            bucket = self._account_buckets.get(account_id)
+            if bucket is None:
+                bucket = self._account_buckets[account_id] = TokenBucket(
+                    *self._account_limit
+                )
+            buckets.append(bucket)
+        if self._spa_limit is not None:
+            match = _SPA_PATH.match(path)
+            if match:
+                spa_id = match.group(1)
+                bucket = self._spa_buckets.get(spa_id)
+                if bucket is None:
+                    bucket = self._spa_buckets[spa_id] = TokenBucket(*self._spa_limit)
+                buckets.append(bucket)
+        return buckets
+
+    def _record(self, flow: str, wait: float):
+        self.stats.record(wait)
+        self.flow_stats[flow].record(wait)
+
+    async def acquire(self, account_id: str | None, path: str) -> float:
+        """Wait until a request for path may be made, returning the wait"""
+        flow = self.flow(account_id, path)
+        buckets = self._buckets(account_id, path)
+        now = time.monotonic()
+        if not self._waiting and all(bucket.delay(now) <= 0 for bucket in buckets):
+            for bucket in buckets:
+                bucket.take(now)
+            self._record(flow, 0.0)
+            return 0.0
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), buckets, now)
+        queue = self._queues.get(flow)
+        if queue is None:
+            queue = self._queues[flow] = collections.deque()
+            self._start_tags[flow] = max(
+                self._finish_tags.get(flow, 0.0), self._virtual_time
+            )
+        queue.append(waiter)
+        self._waiting += 1
+        self._wakeup.set()
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+        # a cancelled waiter is skipped by the dispatcher
+        await waiter.future
+        return time.monotonic() - now
+
+    def _pop(self, flow: str) -> _Waiter:
+        queue = self._queues[flow]
+        waiter = queue.popleft()
+        self._waiting -= 1
+        if not queue:
+            del self._queues[flow]
+            del self._start_tags[flow]
+        return waiter
+
+    async def _dispatch(self):
+        try:
+            while self._queues:
+                now = time.monotonic()
+                chosen = None
+                wake_in = None
+                for flow in list(self._queues):
+                    queue = self._queues[flow]
+                    while queue and queue[0].future.done():
+                        self._pop(flow)
+                    if flow not in self._queues:
+                        continue
+                    delay = max((b.delay(now) for b in queue[0].buckets), default=0)
+                    if delay <= 0:
+                        if (
+                            chosen is None
+                            or self._start_tags[flow] < self._start_tags[chosen]
+                        ):
+                            chosen = flow
+                    elif wake_in is None or delay < wake_in:
+                        wake_in = delay
+
+                if chosen is not None:
+                    start_tag = self._start_tags[chosen]
+                    waiter = self._pop(chosen)
+                    for bucket in waiter.buckets:
+                        bucket.take(now)
+                    self._virtual_time = start_tag
+                    finish_tag = start_tag + 1 / self.weights.get(chosen, 1)
+                    self._finish_tags[chosen] = finish_tag
+                    if chosen in self._queues:
+                        self._start_tags[chosen] = finish_tag
+                    waiter.future.set_result(None)
+                    self._record(chosen, now - waiter.enqueued)
+                    continue
+
+                if wake_in is None:
+                    continue
+                # sleep until a token is due, or a new request arrives
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wake_in)
+                except TimeoutError:
+                    pass
+        finally:
+            self._dispatcher = None
@@ -0,0 +1,149 @@
+import datetime
+import email.utils
+import logging
+import random
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["RetryPolicy", "CircuitBreaker"]
+
+# the id following a collection in a path, e.g. the spa id in spas/{id}/status
+_PATH_ID = re.compile(r"((?:^|/)(?:accounts|spas|pumps|lights|reminders)/)[^/]+")
+
+
+class RetryPolicy:
+    """When and how often SmartTub.request() retries a failed request.
+
+    Only requests using one of the given methods are retried, unless the
+    caller opts in for a particular request. A request is retried when the
+    connection fails, times out or the API responds with one of the given
+    statuses.
+
+    Delays between attempts use "decorrelated jitter": each delay is drawn at
+    random between base_delay and three times the previous delay, capped at
+    max_delay. This spreads out the retries of many clients which failed at
+    the same moment. A Retry-After header from the API is honoured, unless it
+    asks for a longer wait than max_delay, in which case the request fails
+    immediately.
+    """
+
+    def __init__(
+        self,
+        attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        methods=("GET",),
+        statuses=(429, 500, 502, 503, 504),
+    ):
+        """
+        attempts -- the maximum number of attempts, including the first
+        base_delay -- the minimum delay in seconds between attempts
+        max_delay -- the maximum delay in seconds between attempts
+        methods -- HTTP methods to retry by default
+        statuses -- HTTP statuses which are retried
+        """
+        if attempts < 1:
+            raise ValueError("attempts must be at least 1")
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.methods = frozenset(method.upper() for method in methods)
+        self.statuses = frozenset(statuses)
+
+    def retries(self, method: str) -> bool:
+        """Whether requests with this method are retried by default"""
+        return method.upper() in self.methods
+
+    def backoff(self, previous_delay: float | None) -> float:
+        """Return the delay before the next attempt"""
+        if previous_delay is None:
+            previous_delay = self.base_delay
+        upper = max(self.base_delay, previous_delay * 3)
+        return min(self.max_delay, random.uniform(self.base_delay, upper))
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Parse a Retry-After header into a number of seconds from now"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return max(0.0, (retry_at - now).total_seconds())
+
+
+class _Circuit:
+    def __init__(self):
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.probe_started_at: float | None = None
+
+
+class CircuitBreaker:
+    """Fails requests fast while an endpoint of the API keeps failing.
+
+    After failure_threshold consecutive failures, an endpoint's circuit opens
+    and requests to it fail without being sent. Once recovery_timeout seconds
+    have passed, a single trial request is let through: if it succeeds the
+    circuit closes again, otherwise it stays open for another
+    recovery_timeout.
+
+    Endpoints are paths without their query or ids (see endpoint()), so that
+    e.g. the status of every spa shares one circuit.
+
+    A breaker may be shared by several SmartTub instances.
+    """
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._circuits: dict[str, _Circuit] = {}
+
+    @staticmethod
+    def endpoint(path: str) -> str:
+        """The endpoint a request for path belongs to, e.g. spas/*/status"""
+        return _PATH_ID.sub(r"\1*", path.split("?", 1)[0])
+
+    def is_open(self, endpoint: str) -> bool:
+        circuit = self._circuits.get(endpoint)
+        return circuit is not None and circuit.opened_at is not None
+
+    def allow(self, endpoint: str) -> bool:
+        """Whether a request to endpoint may be sent now"""
+        circuit = self._circuits.get(endpoint)
+        if circuit is None or circuit.opened_at is None:
+            return True
+        now = time.monotonic()
+        if now - circuit.opened_at < self.recovery_timeout:
+            return False
+        # half-open: let a single trial request through. If the trial never
+        # reports back (e.g. it was cancelled), allow another one later.
+        if (
+            circuit.probe_started_at is not None
+            and now - circuit.probe_started_at < self.recovery_timeout
+        ):
+            return False
+        circuit.probe_started_at = now
+        return True
+
+    def record_success(self, endpoint: str):
+        self._circuits.pop(endpoint, None)
+
+    def record_failure(self, endpoint: str):
+        circuit = self._circuits.setdefault(endpoint, _Circuit())
+        circuit.failures += 1
+        if circuit.opened_at is not None or circuit.failures >= self.failure_threshold:
+            if circuit.opened_at is None:
+                logger.warning(f"{endpoint} is failing, opening circuit")
+            circuit.opened_at = time.monotonic()
+            circuit.probe_started_at = None
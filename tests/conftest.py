@@ -11,6 +11,7 @@ ACCOUNT_ID = "account_id1"
 @pytest.fixture
 def mock_api():
     api = create_autospec(smarttub.SmartTub, instance=True)
+    api.identity_map = smarttub.IdentityMap()
     return api
 
 
@@ -1,7 +1,11 @@
+import gc
+
 import pytest
 
 import smarttub
 
+from .test_spa import canonical_full_status
+
 pytestmark = pytest.mark.asyncio
 
 
@@ -23,3 +27,71 @@ async def test_get_spas(mock_api, account):
     assert len(spas) == 1
     spa = spas[0]
     assert spa.id == "sid1"
+
+
+async def test_get_spas_from_listing(mock_api, account):
+    mock_api.request.side_effect = [
+        {"content": [{"id": "sid1", "brand": "brand1", "model": "model1"}]},
+        {"id": "sid1", "brand": "brand1", "model": "model1", "serial": "serial1"},
+    ]
+    spas = await account.get_spas()
+    assert len(spas) == 1
+    spa = spas[0]
+    assert spa.name == "brand1 model1"
+    assert not spa.details_loaded
+    assert "serial" not in spa.properties
+    mock_api.request.assert_called_once_with("GET", "spas?ownerId=id1")
+
+    # details are loaded on demand, once
+    details = await spa.get_details()
+    assert details["serial"] == "serial1"
+    assert await spa.get_details() is details
+    assert spa.details_loaded
+    assert spa.properties["serial"] == "serial1"
+    mock_api.request.assert_called_with("GET", "spas/sid1")
+    assert mock_api.request.call_count == 2
+
+
+async def test_get_spas_prefetch_status(mock_api, account):
+    def request(method, path, body=None):
+        if path.startswith("spas?"):
+            return {
+                "content": [
+                    {"id": f"sid{i}", "brand": "brand1", "model": "model1"}
+                    for i in range(3)
+                ]
+            }
+        assert path.endswith("/fullStatus")
+        return canonical_full_status()
+
+    mock_api.request.side_effect = request
+    spas = await account.get_spas(prefetch_status=True)
+    assert len(spas) == 3
+    for spa in spas:
+        assert isinstance(spa.last_status, smarttub.SpaStateFull)
+    assert mock_api.request.call_count == 4
+
+
+async def test_get_spa_identity(mock_api, account):
+    mock_api.request.return_value = {"id": "sid1", "brand": "brand1", "model": "m1"}
+    spa = await account.get_spa("sid1")
+    mock_api.request.return_value = {"id": "sid1", "brand": "brand1", "model": "m2"}
+    assert await account.get_spa("sid1") is spa
+    assert spa.model == "m2"
+
+    mock_api.request.return_value = {
+        "content": [{"id": "sid1", "brand": "brand1", "model": "m2"}]
+    }
+    assert await account.get_spas() == [spa]
+    # the listing does not replace the details already loaded
+    assert spa.details_loaded
+
+
+async def test_get_spa_forgotten(mock_api, account):
+    mock_api.request.return_value = {"id": "sid1", "brand": "brand1", "model": "m1"}
+    spa = await account.get_spa("sid1")
+    assert mock_api.identity_map.get(("Spa", "sid1")) is spa
+    # spas are forgotten once they are no longer used
+    del spa
+    gc.collect()
+    assert mock_api.identity_map.get(("Spa", "sid1")) is None
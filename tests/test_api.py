@@ -1,8 +1,11 @@
+import asyncio
 import base64
-import datetime
 import json
+import time
 
 import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
 import pytest
 
 import smarttub
@@ -11,6 +14,9 @@ ACCOUNT_ID = "account_id1"
 
 pytestmark = pytest.mark.asyncio
 
+# retry quickly so that tests of failures do not wait
+FAST_RETRY_POLICY = smarttub.RetryPolicy(base_delay=0.001, max_delay=0.01)
+
 
 def make_id_token(account_id: str) -> str:
     """Create a mock ID token with the account_id claim."""
@@ -39,7 +45,7 @@ def make_login_response(account_id: str, expires_in: int = 86400) -> dict:
 @pytest.fixture(name="unauthenticated_api")
 async def unauthenticated_api():
     async with aiohttp.ClientSession() as session:
-        yield smarttub.SmartTub(session)
+        yield smarttub.SmartTub(session, retry_policy=FAST_RETRY_POLICY)
 
 
 @pytest.fixture(name="api")
@@ -90,7 +96,7 @@ async def test_login_failed_401(unauthenticated_api, aresponses):
 async def test_token_reauth_on_expiry(api, aresponses):
     """Test that we re-authenticate when the token expires."""
     # Expire the token
-    api._token_expires_at = datetime.datetime.now() - datetime.timedelta(seconds=1)
+    api._token_expires_at = time.monotonic() - 1
 
     # Mock the re-login response
     aresponses.add(
@@ -110,10 +116,102 @@ async def test_token_reauth_on_expiry(api, aresponses):
     )
 
     response = await api.request("GET", "/")
-    assert api._token_expires_at > datetime.datetime.now()
+    assert api._token_expires_at > time.monotonic()
     assert response.get("status") == "OK"
 
 
+async def test_token_reauth_single_flight(api, aresponses):
+    """Concurrent requests with an expired token share a single login."""
+    api._token_expires_at = time.monotonic() - 1
+
+    async def slow_login(request):
+        await asyncio.sleep(0.05)
+        return aresponses.Response(
+            body=json.dumps(make_login_response(ACCOUNT_ID)),
+            status=201,
+            content_type="application/json",
+        )
+
+    aresponses.add("api.smarttub.io", "/idp/signin", "POST", slow_login)
+    for i in range(10):
+        aresponses.add(
+            "api.smarttub.io",
+            f"/spas/spa{i}/status",
+            "GET",
+            aresponses.Response(
+                body=json.dumps({"status": "OK"}),
+                status=200,
+                content_type="application/json",
+            ),
+        )
+
+    responses = await asyncio.gather(
+        *[api.request("GET", f"spas/spa{i}/status") for i in range(10)]
+    )
+    assert all(response == {"status": "OK"} for response in responses)
+    aresponses.assert_plan_strictly_followed()
+
+
+async def test_token_proactive_refresh(api, aresponses):
+    """A token close to expiry is refreshed in the background."""
+    api._token_expires_at = time.monotonic() + api._token_refresh_margin / 2
+
+    aresponses.add(
+        "api.smarttub.io",
+        "/idp/signin",
+        "POST",
+        aresponses.Response(
+            body=json.dumps(make_login_response(ACCOUNT_ID)),
+            status=201,
+            content_type="application/json",
+        ),
+    )
+    aresponses.add(
+        "api.smarttub.io",
+        "/status",
+        "GET",
+        aresponses.Response(
+            body=json.dumps({"status": "OK"}),
+            status=200,
+            content_type="application/json",
+        ),
+    )
+
+    response = await api.request("GET", "status")
+    assert response == {"status": "OK"}
+    await api._login_task
+    assert api._token_expires_at > time.monotonic() + api._token_refresh_margin
+    aresponses.assert_all_requests_matched()
+    aresponses.assert_no_unused_routes()
+
+
+async def test_token_refresh_timer(unauthenticated_api, aresponses):
+    """The token is refreshed before it expires even if no request is made"""
+    api = unauthenticated_api
+    expires_in = api._token_refresh_margin + 0.05
+    for _ in range(2):
+        aresponses.add(
+            "api.smarttub.io",
+            "/idp/signin",
+            "POST",
+            aresponses.Response(
+                body=json.dumps(make_login_response(ACCOUNT_ID, expires_in)),
+                status=201,
+                content_type="application/json",
+            ),
+        )
+    await api.login("username1", "password1")
+    expires_at = api._token_expires_at
+
+    await asyncio.sleep(0.1)
+    assert api._login_task is not None
+    await api._login_task
+    assert api._token_expires_at > expires_at
+    aresponses.assert_all_requests_matched()
+    await api.close()
+    assert api._refresh_handle is None
+
+
 async def test_get_account(api, aresponses):
     aresponses.add(
         response=aresponses.Response(
@@ -149,3 +247,417 @@ async def test_request_empty_response(api, aresponses):
     )
     response = await api.request("GET", "/")
     assert response is None
+
+
+async def test_context_manager_owns_session():
+    async with smarttub.SmartTub(connection_limit=10, keepalive_timeout=5) as api:
+        session = api._session
+        assert session.connector.limit == 10
+        assert not session.closed
+    assert session.closed
+    with pytest.raises(RuntimeError):
+        await api.request("GET", "status")
+
+
+async def test_context_manager_borrowed_session():
+    async with aiohttp.ClientSession() as session:
+        async with smarttub.SmartTub(session):
+            pass
+        assert not session.closed
+
+
+async def test_close_drains_requests(aresponses):
+    async def slow_response(request):
+        await asyncio.sleep(0.05)
+        return aresponses.Response(
+            body=json.dumps({"status": "OK"}),
+            status=200,
+            content_type="application/json",
+        )
+
+    aresponses.add("api.smarttub.io", "/status", "GET", slow_response)
+    api = smarttub.SmartTub()
+    api._access_token = "access_token_123"
+
+    request = asyncio.create_task(api.request("GET", "status"))
+    await asyncio.sleep(0.01)
+    await api.close()
+    assert await request == {"status": "OK"}
+    assert api._session.closed
+
+
+async def test_close_drains_retrying_request(local_server):
+    policy = smarttub.RetryPolicy(base_delay=0.001, max_delay=1)
+    api = smarttub.SmartTub(retry_policy=policy)
+    api.API_BASE = str(local_server.make_url("")).rstrip("/")
+    api._access_token = "access_token_123"
+
+    request = asyncio.create_task(
+        api.request("GET", "flaky?key=close&failures=1&retry_after=0.1")
+    )
+    await asyncio.sleep(0.05)
+    closing = asyncio.create_task(api.close())
+    await asyncio.sleep(0)
+    # no new requests while closing, but the retry goes ahead
+    with pytest.raises(RuntimeError):
+        await api.request("GET", "ok")
+    assert await request == {"attempts": 2}
+    await closing
+    assert api._session.closed
+
+
+async def test_preconnect(aresponses):
+    aresponses.add(
+        "api.smarttub.io",
+        "/idp/signin",
+        "POST",
+        aresponses.Response(
+            body=json.dumps(make_login_response(ACCOUNT_ID)),
+            status=201,
+            content_type="application/json",
+        ),
+    )
+    for _ in range(2):
+        aresponses.add("api.smarttub.io", "/", "HEAD", aresponses.Response(status=404))
+
+    async with smarttub.SmartTub(preconnect=2) as api:
+        await api.login("username1", "password1")
+    aresponses.assert_plan_strictly_followed()
+
+
+@pytest.fixture(name="local_server")
+async def local_server():
+    """A local API server with slow, chunked and failing endpoints"""
+
+    async def ok(request):
+        return web.json_response({"status": "OK"})
+
+    async def empty(request):
+        return web.Response(status=200)
+
+    async def chunked(request):
+        response = web.StreamResponse()
+        response.enable_chunked_encoding()
+        response.content_type = "application/json"
+        await response.prepare(request)
+        await response.write(b'{"status": ')
+        await asyncio.sleep(float(request.query.get("delay", 0)))
+        await response.write(b'"OK"}')
+        await response.write_eof()
+        return response
+
+    async def error(request):
+        return web.json_response({"message": "oops"}, status=500)
+
+    hits = {}
+
+    async def slow(request):
+        """Count requests for each key, and respond after a short delay"""
+        key = request.query["key"]
+        hits[key] = count = hits.get(key, 0) + 1
+        await asyncio.sleep(0.05)
+        return web.json_response({"hits": count})
+
+    failures = {}
+
+    async def flaky(request):
+        """Fail with the given status the given number of times, then succeed"""
+        key = (request.method, request.query["key"])
+        failures[key] = failures.get(key, 0) + 1
+        if failures[key] <= int(request.query["failures"]):
+            return web.Response(
+                status=int(request.query.get("status", 503)),
+                headers={"Retry-After": request.query.get("retry_after", "0")},
+            )
+        return web.json_response({"attempts": failures[key]})
+
+    app = web.Application()
+    app.router.add_get("/ok", ok)
+    app.router.add_get("/empty", empty)
+    app.router.add_get("/chunked", chunked)
+    app.router.add_get("/error", error)
+    app.router.add_get("/flaky", flaky)
+    app.router.add_get("/slow", slow)
+
+    not_modified = []
+
+    async def etag(request):
+        if request.headers.get("If-None-Match") == '"v1"':
+            not_modified.append(request.path)
+            return web.Response(status=304, headers={"ETag": '"v1"'})
+        return web.json_response({"version": 1}, headers={"ETag": '"v1"'})
+
+    app.router.add_get("/etag", etag)
+    app["not_modified"] = not_modified
+    app.router.add_get("/spas/{spa_id}/error", error)
+    app.router.add_get("/spas/{spa_id}/{resource}", slow)
+    app.router.add_patch("/spas/{spa_id}/{resource}", ok)
+    app.router.add_post("/spas/{spa_id}/{resource}", ok)
+    app.router.add_post("/flaky", flaky)
+    server = TestServer(app)
+    await server.start_server()
+    yield server
+    await server.close()
+
+
+@pytest.fixture(name="local_api")
+async def local_api(local_server):
+    async with smarttub.SmartTub(
+        connection_limit=10, retry_policy=FAST_RETRY_POLICY, circuit_breaker=False
+    ) as api:
+        api.API_BASE = str(local_server.make_url("")).rstrip("/")
+        api._access_token = "access_token_123"
+        yield api
+
+
+async def test_request_chunked_response(local_api):
+    assert await local_api.request("GET", "chunked") == {"status": "OK"}
+    assert await local_api.request("GET", "empty") is None
+
+
+async def test_request_error_releases_connection(local_api):
+    for _ in range(25):
+        with pytest.raises(smarttub.APIError) as exc_info:
+            await asyncio.wait_for(local_api.request("GET", "error"), 5)
+        assert exc_info.value.status == 500
+    assert await asyncio.wait_for(local_api.request("GET", "ok"), 5) == {"status": "OK"}
+
+
+async def test_request_cancellation_stress(local_api):
+    """Cancelling many in-flight requests must not exhaust the pool"""
+    # distinct paths, so that the requests are not coalesced into one
+    tasks = [
+        asyncio.create_task(local_api.request("GET", f"chunked?delay=10&i={i}"))
+        for i in range(2000)
+    ]
+    await asyncio.sleep(0.2)
+    for task in tasks:
+        task.cancel()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
+    assert local_api._inflight == 0
+
+    # every pooled connection must be usable again
+    results = await asyncio.wait_for(
+        asyncio.gather(*[local_api.request("GET", "chunked") for _ in range(50)]),
+        5,
+    )
+    assert all(result == {"status": "OK"} for result in results)
+
+
+async def test_request_uses_codec(local_server):
+    class CountingCodec(smarttub.StdlibJSONCodec):
+        calls = 0
+
+        def loads(self, data):
+            self.calls += 1
+            return super().loads(data)
+
+    json_codec = CountingCodec()
+    async with smarttub.SmartTub(json_codec=json_codec) as api:
+        api.API_BASE = str(local_server.make_url("")).rstrip("/")
+        api._access_token = "access_token_123"
+        assert await api.request("GET", "ok") == {"status": "OK"}
+    assert json_codec.calls == 1
+
+
+async def test_retry_get(local_api):
+    response = await local_api.request("GET", "flaky?key=get&failures=2")
+    assert response == {"attempts": 3}
+
+
+async def test_retry_exhausted(local_api):
+    with pytest.raises(smarttub.APIError) as exc_info:
+        await local_api.request("GET", "flaky?key=exhausted&failures=3")
+    assert exc_info.value.status == 503
+
+
+async def test_retry_post_opt_in(local_api):
+    with pytest.raises(smarttub.APIError):
+        await local_api.request("POST", "flaky?key=post&failures=1", {})
+    response = await local_api.request(
+        "POST", "flaky?key=post_opt_in&failures=1", {}, retry=True
+    )
+    assert response == {"attempts": 2}
+
+
+async def test_retry_after_too_long(local_api):
+    with pytest.raises(smarttub.APIError) as exc_info:
+        await local_api.request(
+            "GET", "flaky?key=throttled&failures=1&status=429&retry_after=3600"
+        )
+    assert exc_info.value.status == 429
+
+
+async def test_circuit_breaker(local_server):
+    breaker = smarttub.CircuitBreaker(failure_threshold=2, recovery_timeout=60)
+    async with smarttub.SmartTub(retry_policy=None, circuit_breaker=breaker) as api:
+        api.API_BASE = str(local_server.make_url("")).rstrip("/")
+        api._access_token = "access_token_123"
+
+        for _ in range(2):
+            with pytest.raises(smarttub.APIError):
+                await api.request("GET", "error")
+        assert breaker.is_open("error")
+        with pytest.raises(smarttub.CircuitOpen):
+            await api.request("GET", "error")
+        # other endpoints are unaffected
+        assert await api.request("GET", "ok") == {"status": "OK"}
+
+
+async def test_circuit_breaker_many_spas(local_server):
+    breaker = smarttub.CircuitBreaker(failure_threshold=2, recovery_timeout=60)
+    async with smarttub.SmartTub(retry_policy=None, circuit_breaker=breaker) as api:
+        api.API_BASE = str(local_server.make_url("")).rstrip("/")
+        api._access_token = "access_token_123"
+
+        for spa_id in ("spa1", "spa2"):
+            with pytest.raises(smarttub.APIError):
+                await api.request("GET", f"spas/{spa_id}/error")
+        # the failures of different spas open the endpoint's circuit
+        for spa_id in ("spa1", "spa2", "spa3"):
+            with pytest.raises(smarttub.CircuitOpen):
+                await api.request("GET", f"spas/{spa_id}/error")
+        path = "spas/spa3/status?key=many_spas"
+        assert await api.request("GET", path) == {"hits": 1}
+
+
+async def test_rate_limiter(local_server):
+    limiter = smarttub.RateLimiter(rate=1000)
+    async with smarttub.SmartTub(rate_limiter=limiter) as api:
+        api.API_BASE = str(local_server.make_url("")).rstrip("/")
+        api._access_token = "access_token_123"
+        await asyncio.gather(*[api.request("GET", f"ok?i={i}") for i in range(5)])
+    assert limiter.stats.count == 5
+
+
+async def test_coalesce_get(local_api):
+    responses = await asyncio.gather(
+        *[local_api.request("GET", "slow?key=coalesce") for _ in range(10)]
+    )
+    assert all(response is responses[0] for response in responses)
+    assert responses[0] == {"hits": 1}
+
+    # once complete, the next GET makes a new request
+    assert await local_api.request("GET", "slow?key=coalesce") == {"hits": 2}
+
+
+async def test_coalesce_cancelled_caller(local_api):
+    first = asyncio.create_task(local_api.request("GET", "slow?key=cancelled"))
+    await asyncio.sleep(0.01)
+    second = asyncio.create_task(local_api.request("GET", "slow?key=cancelled"))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    assert await second == {"hits": 1}
+
+
+async def test_coalesce_all_callers_cancelled(local_api):
+    """A shared GET which nobody waits for any more must release its connection"""
+    tasks = [
+        asyncio.create_task(local_api.request("GET", f"chunked?delay=10&i={i}"))
+        for i in range(200)
+        for _ in range(2)
+    ]
+    await asyncio.sleep(0.2)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    assert not local_api._single_flight._calls
+
+    response = await asyncio.wait_for(local_api.request("GET", "chunked?i=0"), 2)
+    assert response == {"status": "OK"}
+
+
+async def test_coalesce_disabled(local_server):
+    async with smarttub.SmartTub(coalesce_requests=False) as api:
+        api.API_BASE = str(local_server.make_url("")).rstrip("/")
+        api._access_token = "access_token_123"
+        responses = await asyncio.gather(
+            *[api.request("GET", "slow?key=disabled") for _ in range(3)]
+        )
+    assert sorted(response["hits"] for response in responses) == [1, 2, 3]
+
+
+@pytest.fixture(name="cached_api")
+async def cached_api(local_server):
+    cache = smarttub.ResponseCache(ttls={"status": 60, "fullStatus": 0})
+    async with smarttub.SmartTub(
+        retry_policy=FAST_RETRY_POLICY, response_cache=cache
+    ) as api:
+        api.API_BASE = str(local_server.make_url("")).rstrip("/")
+        api._access_token = "access_token_123"
+        yield api
+
+
+async def test_cache_hit(cached_api):
+    path = "spas/spa1/status?key=cache_hit"
+    assert await cached_api.request("GET", path) == {"hits": 1}
+    assert await cached_api.request("GET", path) == {"hits": 1}
+
+
+async def test_cache_invalidated_by_write(cached_api):
+    path = "spas/spa1/status?key=invalidated"
+    assert await cached_api.request("GET", path) == {"hits": 1}
+    await cached_api.request("PATCH", "spas/spa1/config", {"heatMode": "AUTO"})
+    assert await cached_api.request("GET", path) == {"hits": 2}
+
+
+async def test_cache_not_invalidated_by_read(cached_api):
+    path = "spas/spa1/status?key=read"
+    assert await cached_api.request("GET", path) == {"hits": 1}
+    await cached_api.request("POST", "spas/spa1/energyUsage", {"start": "x"})
+    assert await cached_api.request("GET", path) == {"hits": 1}
+
+
+async def test_cache_bypassed(cached_api):
+    path = "spas/spa1/status?key=bypassed"
+    assert await cached_api.request("GET", path) == {"hits": 1}
+    assert await cached_api.request("GET", path, cache=False) == {"hits": 2}
+    # the fresh response replaces the cached one
+    assert await cached_api.request("GET", path) == {"hits": 2}
+
+
+async def test_cache_stale_while_revalidate(cached_api):
+    cached_api._cache.stale_while_revalidate = True
+    path = "spas/spa1/fullStatus?key=swr"
+    assert await cached_api.request("GET", path) == {"hits": 1}
+    # expired: the stale response is returned while it is refreshed
+    assert await cached_api.request("GET", path) == {"hits": 1}
+    await asyncio.gather(*cached_api._background)
+    assert await cached_api.request("GET", path) == {"hits": 2}
+
+
+async def test_cache_stale_on_error(cached_api):
+    cached_api._cache.stale_while_revalidate = True
+    cached_api._cache.set("spas/spa1/fullStatus", {"stale": True})
+    # the local server has no such route, so fetching fails
+    cached_api.API_BASE += "/missing"
+    assert await cached_api.request("GET", "spas/spa1/fullStatus") == {"stale": True}
+    await asyncio.gather(*cached_api._background)
+    assert await cached_api.request("GET", "spas/spa1/fullStatus") == {"stale": True}
+
+
+async def test_conditional_get_etag(local_api, local_server):
+    first = await local_api.request("GET", "etag")
+    assert first == {"version": 1}
+    second = await local_api.request("GET", "etag")
+    assert second is first
+    assert local_server.app["not_modified"] == ["/etag"]
+
+
+async def test_conditional_get_unchanged_body(local_api):
+    first = await local_api.request("GET", "ok")
+    second = await local_api.request("GET", "ok")
+    assert second is first
+
+    changed = await local_api.request("GET", "slow?key=changed")
+    assert await local_api.request("GET", "slow?key=changed") is not changed
+
+
+async def test_conditional_get_disabled(local_server):
+    async with smarttub.SmartTub(conditional_requests=False) as api:
+        api.API_BASE = str(local_server.make_url("")).rstrip("/")
+        api._access_token = "access_token_123"
+        first = await api.request("GET", "etag")
+        assert await api.request("GET", "etag") is not first
+    assert local_server.app["not_modified"] == []
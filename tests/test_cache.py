@@ -0,0 +1,61 @@
+import pytest
+
+import smarttub
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_ttl():
+    cache = smarttub.ResponseCache(ttls={"status": 5, "fullStatus": 10})
+    assert cache.ttl("spas/id1/status") == 5
+    assert cache.ttl("spas/id1/fullStatus") == 10
+    assert cache.ttl("spas/id1/debugStatus") is None
+    assert cache.ttl("spas/id1") is None
+    assert cache.ttl("accounts/id1") is None
+
+
+async def test_get_set():
+    cache = smarttub.ResponseCache()
+    assert cache.get("spas/id1/status") is None
+    cache.set("spas/id1/status", {"state": "NORMAL"})
+    entry = cache.get("spas/id1/status")
+    assert entry.value == {"state": "NORMAL"}
+    assert entry.age(entry.stored_at + 3) == 3
+
+
+async def test_lru_eviction():
+    cache = smarttub.ResponseCache(max_entries=2)
+    cache.set("spas/id1/status", 1)
+    cache.set("spas/id2/status", 2)
+    cache.get("spas/id1/status")
+    cache.set("spas/id3/status", 3)
+    assert len(cache) == 2
+    assert cache.get("spas/id2/status") is None
+    assert cache.get("spas/id1/status").value == 1
+
+
+async def test_invalidate():
+    cache = smarttub.ResponseCache()
+    cache.set("spas/id1/status", 1)
+    cache.set("spas/id1/pumps", 2)
+    cache.set("spas/id2/status", 3)
+
+    generation = cache.generation("spas/id1/status")
+    cache.invalidate("spas/id1/config")
+    assert cache.get("spas/id1/status") is None
+    assert cache.get("spas/id1/pumps") is None
+    assert cache.get("spas/id2/status").value == 3
+
+    # a response fetched before the invalidation is not stored
+    cache.set("spas/id1/status", 1, generation)
+    assert cache.get("spas/id1/status") is None
+    cache.set("spas/id1/status", 1, cache.generation("spas/id1/status"))
+    assert cache.get("spas/id1/status").value == 1
+
+
+async def test_changes():
+    cache = smarttub.ResponseCache()
+    assert cache.changes("spas/id1/config")
+    assert cache.changes("spas/id1/pumps/P1/toggle")
+    assert cache.changes("spas/id1/lock")
+    assert not cache.changes("spas/id1/energyUsage")
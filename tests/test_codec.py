@@ -0,0 +1,50 @@
+import pytest
+
+import smarttub
+from smarttub import codec
+
+pytestmark = pytest.mark.asyncio
+
+CODECS = [
+    codec.StdlibJSONCodec,
+    pytest.param(
+        codec.OrjsonCodec,
+        marks=pytest.mark.skipif(codec.orjson is None, reason="orjson not installed"),
+    ),
+    pytest.param(
+        codec.MsgspecCodec,
+        marks=pytest.mark.skipif(codec.msgspec is None, reason="msgspec not installed"),
+    ),
+]
+
+
+@pytest.mark.parametrize("codec_class", CODECS)
+async def test_round_trip(codec_class):
+    json_codec = codec_class()
+    obj = {"setTemperature": 38.3, "lights": [{"zone": 1, "mode": "OFF"}], "x": None}
+    encoded = json_codec.dumps(obj)
+    assert isinstance(encoded, bytes)
+    assert json_codec.loads(encoded) == obj
+    assert json_codec.loads(encoded.decode()) == obj
+
+
+@pytest.mark.parametrize("codec_class", CODECS)
+async def test_invalid_json(codec_class):
+    with pytest.raises(ValueError):
+        codec_class().loads(b"<html>")
+
+
+async def test_default_codec():
+    json_codec = codec.default_codec()
+    if codec.orjson is not None:
+        assert isinstance(json_codec, codec.OrjsonCodec)
+    elif codec.msgspec is not None:
+        assert isinstance(json_codec, codec.MsgspecCodec)
+    else:
+        assert isinstance(json_codec, codec.StdlibJSONCodec)
+
+
+async def test_smarttub_codec():
+    json_codec = smarttub.StdlibJSONCodec()
+    api = smarttub.SmartTub(json_codec=json_codec)
+    assert api._codec is json_codec
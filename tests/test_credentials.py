@@ -0,0 +1,129 @@
+import json
+import os
+import time
+
+import aiohttp
+import pytest
+
+import smarttub
+
+from .test_api import ACCOUNT_ID, make_login_response
+
+pytestmark = pytest.mark.asyncio
+
+
+def stored_credentials(expires_in=3600, access_token="stored_token"):
+    return {
+        "access_token": access_token,
+        "expires_at": time.time() + expires_in,
+        "account_id": ACCOUNT_ID,
+    }
+
+
+def login_route(aresponses):
+    aresponses.add(
+        "api.smarttub.io",
+        "/idp/signin",
+        "POST",
+        aresponses.Response(
+            body=json.dumps(make_login_response(ACCOUNT_ID)),
+            status=201,
+            content_type="application/json",
+        ),
+    )
+
+
+@pytest.fixture(name="store")
+def store():
+    return smarttub.MemoryCredentialStore()
+
+
+@pytest.fixture(name="api")
+async def api(store):
+    async with aiohttp.ClientSession() as session:
+        yield smarttub.SmartTub(session, credential_store=store)
+
+
+async def test_memory_store(store):
+    assert store.load("username1") is None
+    store.save("username1", stored_credentials())
+    assert store.load("username1")["access_token"] == "stored_token"
+    store.clear("username1")
+    assert store.load("username1") is None
+
+
+async def test_file_store(tmp_path):
+    path = tmp_path / "tokens.json"
+    store = smarttub.FileCredentialStore(path)
+    assert store.load("username1") is None
+
+    store.save("username1", stored_credentials())
+    store.save("username2", stored_credentials(access_token="other_token"))
+    assert os.stat(path).st_mode & 0o777 == 0o600
+
+    reopened = smarttub.FileCredentialStore(path)
+    assert reopened.load("username1")["access_token"] == "stored_token"
+    reopened.clear("username1")
+    assert reopened.load("username1") is None
+    assert reopened.load("username2")["access_token"] == "other_token"
+
+
+async def test_file_store_corrupt(tmp_path):
+    path = tmp_path / "tokens.json"
+    path.write_text("{not json")
+    store = smarttub.FileCredentialStore(path)
+    assert store.load("username1") is None
+    store.save("username1", stored_credentials())
+    assert store.load("username1")["access_token"] == "stored_token"
+
+
+async def test_login_saves_credentials(api, store, aresponses):
+    login_route(aresponses)
+    await api.login("username1", "password1")
+
+    stored = store.load("username1")
+    assert stored["access_token"] == "access_token_123"
+    assert stored["account_id"] == ACCOUNT_ID
+    assert stored["expires_at"] > time.time()
+
+
+async def test_login_uses_stored_credentials(api, store, aresponses):
+    store.save("username1", stored_credentials())
+
+    await api.login("username1", "password1")
+    assert api._access_token == "stored_token"
+    assert api.account_id == ACCOUNT_ID
+    aresponses.assert_plan_strictly_followed()
+
+
+async def test_login_ignores_expired_credentials(api, store, aresponses):
+    store.save("username1", stored_credentials(expires_in=-10))
+    login_route(aresponses)
+
+    await api.login("username1", "password1")
+    assert api._access_token == "access_token_123"
+    assert store.load("username1")["access_token"] == "access_token_123"
+
+
+async def test_rejected_stored_token(api, store, aresponses):
+    store.save("username1", stored_credentials())
+    await api.login("username1", "password1")
+
+    aresponses.add("api.smarttub.io", "/status", "GET", aresponses.Response(status=401))
+    login_route(aresponses)
+    aresponses.add(
+        "api.smarttub.io",
+        "/status",
+        "GET",
+        aresponses.Response(
+            body=json.dumps({"status": "OK"}),
+            status=200,
+            content_type="application/json",
+        ),
+    )
+
+    response = await api.request("GET", "status")
+    assert response == {"status": "OK"}
+    assert api._access_token == "access_token_123"
+    assert store.load("username1")["access_token"] == "access_token_123"
+    aresponses.assert_plan_strictly_followed()
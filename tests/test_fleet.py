@@ -0,0 +1,183 @@
+import asyncio
+
+import pytest
+
+import smarttub
+
+from .test_spa import canonical_full_status
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture(name="spas")
+def spas(mock_api):
+    return [
+        smarttub.Spa(mock_api, None, id=f"spa{i}", brand="brand1", model="model1")
+        for i in range(5)
+    ]
+
+
+async def test_fleet_poller(mock_api, spas):
+    active = 0
+    max_active = 0
+
+    async def request(method, path, body=None, cache=True):
+        nonlocal active, max_active
+        active += 1
+        max_active = max(max_active, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        if path == "spas/spa4/fullStatus":
+            raise smarttub.APIError("unavailable")
+        return canonical_full_status()
+
+    mock_api.request.side_effect = request
+    queue = asyncio.Queue()
+    results = []
+    async with smarttub.FleetPoller(
+        results.append, queue=queue, interval=0.05, max_concurrency=2
+    ) as poller:
+        for spa in spas:
+            poller.add_spa(spa)
+        assert len(poller) == 5
+        await asyncio.sleep(0.2)
+    assert max_active == 2
+    assert {result.spa.id for result in results} == {spa.id for spa in spas}
+    assert queue.qsize() == len(results)
+    for result in results:
+        assert str(result)
+        if result.spa.id == "spa4":
+            assert not result.ok
+            assert isinstance(result.error, smarttub.APIError)
+        else:
+            assert isinstance(result.state, smarttub.SpaStateFull)
+    # each spa was polled more than once
+    assert len(results) > 10
+    # polls cancelled by stop() are not delivered
+    assert poller.lag_stats.count - len(results) in (0, 1, 2)
+
+
+async def test_fleet_poller_restart(mock_api, spas):
+    polled = asyncio.Event()
+
+    async def request(method, path, body=None, cache=True):
+        polled.set()
+        await asyncio.sleep(10)
+
+    mock_api.request.side_effect = request
+    poller = smarttub.FleetPoller(interval=0)
+    poller.add_spa(spas[0])
+    poller.start()
+    await polled.wait()
+    await poller.stop()
+
+    # the poll cancelled by stop() is made again after a restart
+    mock_api.request.side_effect = lambda *args, **kwargs: canonical_full_status()
+    results = []
+    poller.callback = results.append
+    async with poller:
+        await asyncio.sleep(0.05)
+    assert results and results[0].spa is spas[0]
+
+
+async def test_fleet_poller_callback_failed(mock_api, spas, caplog):
+    mock_api.request.side_effect = lambda *args, **kwargs: canonical_full_status()
+    calls = []
+
+    async def callback(result):
+        calls.append(result)
+        raise ValueError("oops")
+
+    queue = asyncio.Queue()
+    poller = smarttub.FleetPoller(callback, queue=queue, interval=0.05)
+    poller.add_spa(spas[0])
+    async with poller:
+        await asyncio.sleep(0.2)
+    # a failing callback is logged, and neither stops polling nor the queue
+    assert len(calls) > 1
+    assert queue.qsize() >= len(calls) - 1
+    assert "callback failed" in caplog.text
+
+
+async def test_fleet_poller_priority(mock_api, spas):
+    mock_api.request.side_effect = lambda method, path, body=None, cache=True: (
+        canonical_full_status()
+    )
+    # a change which is waiting to be sent
+    change = asyncio.create_task(spas[3].set_temperature(38.3))
+    await asyncio.sleep(0)
+
+    results = []
+    poller = smarttub.FleetPoller(results.append, interval=0, max_concurrency=1)
+    for spa in spas:
+        poller.add_spa(spa)
+    async with poller:
+        await asyncio.sleep(0.01)
+    assert results[0].spa is spas[3]
+    await change
+
+
+async def test_fleet_poller_add_account(mock_api, spas):
+    mock_api.get_account.return_value.get_spas.return_value = spas
+    poller = smarttub.FleetPoller()
+    assert await poller.add_account(mock_api) == spas
+    assert len(poller) == 5
+    poller.remove_spa(spas[0])
+    assert len(poller) == 4
+
+
+async def test_adaptive_interval(spas):
+    policy = smarttub.AdaptiveInterval(active=10, idle=300, offline_max=3600)
+
+    def state(**overrides):
+        return smarttub.SpaStateFull(spas[0], canonical_full_status(**overrides))
+
+    # canonical state: idle at 14:45, filtration from 02:00 to 06:00
+    idle = state()
+    assert not policy.is_active(idle)
+    assert policy.interval(idle) == 300
+
+    assert policy.interval(state(heater="ON")) == 10
+    assert policy.interval(state(cleanupCycle="ACTIVE")) == 10
+    jets = canonical_full_status()["pumps"]
+    jets[0]["state"] = "HIGH"
+    assert policy.interval(state(pumps=jets)) == 10
+    # circulation pumps do not count
+    circulation = canonical_full_status()["pumps"]
+    circulation[1]["state"] = "HIGH"
+    assert policy.interval(state(pumps=circulation)) == 300
+
+    # poll just after filtration starts or stops
+    assert policy.until_filtration_change(state(time="01:58:00")) == 120
+    assert policy.interval(state(time="01:58:00")) == 121
+    assert policy.interval(state(time="05:59:58")) == 10
+    assert policy.until_filtration_change(state(time="02:00:00")) == 4 * 3600
+
+    # back off while offline
+    offline = state(online=False)
+    assert [policy.interval(offline, n) for n in (1, 2, 3, 10)] == [
+        300,
+        600,
+        1200,
+        3600,
+    ]
+
+
+async def test_fleet_poller_interval_policy(mock_api, spas):
+    mock_api.request.side_effect = lambda method, path, body=None, cache=True: (
+        canonical_full_status(online=path != "spas/spa1/fullStatus")
+    )
+    results = []
+    poller = smarttub.FleetPoller(
+        results.append,
+        interval=0.01,
+        interval_policy=smarttub.AdaptiveInterval(active=0, idle=60),
+    )
+    async with poller:
+        poller.add_spa(spas[0])
+        poller.add_spa(spas[1])
+        await asyncio.sleep(0.05)
+    # polled once, then scheduled for a minute later
+    assert len(results) == 2
+    assert poller._spas["spa0"].interval == 60
+    assert poller._spas["spa1"].offline_polls == 1
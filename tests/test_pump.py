@@ -34,3 +34,14 @@ async def test_pump(mock_spa, pumps):
     assert circ.type == SpaPump.PumpType.CIRCULATION
     await circ.toggle()
     mock_spa.request.assert_called_with("POST", f"pumps/{circ.id}/toggle")
+
+
+async def test_pump_properties_opt_in(mock_spa, pumps, monkeypatch):
+    pump = pumps[0]
+    assert not hasattr(pump, "__dict__")
+    assert pump.properties is None
+
+    monkeypatch.setattr(SpaPump, "KEEP_PROPERTIES", True)
+    properties = {"id": "pid1", "speed": "speed1", "state": "LOW", "type": "JET"}
+    pump = SpaPump(mock_spa, **properties)
+    assert pump.properties == properties
@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+import pytest
+
+import smarttub
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_token_bucket():
+    bucket = smarttub.TokenBucket(rate=10, burst=2)
+    now = time.monotonic()
+    assert bucket.delay(now) == 0
+    bucket.take(now)
+    bucket.take(now)
+    assert bucket.delay(now) == pytest.approx(0.1)
+    assert bucket.delay(now + 0.1) == 0
+
+    with pytest.raises(ValueError):
+        smarttub.TokenBucket(rate=0)
+
+
+async def test_flow():
+    flow = smarttub.RateLimiter.flow
+    assert flow("account1", "spas/spa1/status") == "spa:spa1"
+    assert flow("account1", "spas?ownerId=account1") == "account:account1"
+    assert flow("account1", "accounts/account1") == "account:account1"
+
+
+async def test_unlimited():
+    limiter = smarttub.RateLimiter()
+    for _ in range(100):
+        assert await limiter.acquire("account1", "spas/spa1/status") == 0
+    assert limiter.stats.count == 100
+    assert limiter.stats.delayed == 0
+
+
+async def test_rate_limited():
+    limiter = smarttub.RateLimiter(rate=100, burst=1)
+    start = time.monotonic()
+    await asyncio.gather(
+        *[limiter.acquire("account1", "spas/spa1/status") for _ in range(6)]
+    )
+    assert time.monotonic() - start >= 0.04
+    assert limiter.stats.count == 6
+    assert limiter.stats.delayed == 5
+    assert limiter.stats.max_wait >= 0.04
+    assert limiter.flow_stats["spa:spa1"].count == 6
+
+
+async def test_fairness():
+    """A busy spa does not starve the others"""
+    limiter = smarttub.RateLimiter(rate=200, burst=1)
+    granted = []
+
+    async def request(spa_id):
+        await limiter.acquire("account1", f"spas/{spa_id}/status")
+        granted.append(spa_id)
+
+    busy = [asyncio.create_task(request("busy")) for _ in range(20)]
+    await asyncio.sleep(0)
+    quiet = [asyncio.create_task(request(f"quiet{i}")) for i in range(3)]
+    await asyncio.gather(*busy, *quiet)
+
+    # the quiet spas are interleaved with the busy one instead of queuing
+    # behind all of its requests
+    assert max(granted.index(f"quiet{i}") for i in range(3)) < 8
+
+
+async def test_weights():
+    limiter = smarttub.RateLimiter(rate=500, burst=1, weights={"spa:heavy": 3})
+    granted = []
+
+    async def request(spa_id):
+        await limiter.acquire("account1", f"spas/{spa_id}/status")
+        granted.append(spa_id)
+
+    await limiter.acquire("account1", "spas/heavy/status")
+    await asyncio.gather(
+        *[request("heavy") for _ in range(12)], *[request("light") for _ in range(12)]
+    )
+    assert granted[:12].count("heavy") >= 8
+
+
+async def test_per_spa_limit():
+    limiter = smarttub.RateLimiter(spa_rate=100, spa_burst=1)
+    await limiter.acquire("account1", "spas/spa1/status")
+    # another spa is not held back by spa1's limit
+    assert await limiter.acquire("account1", "spas/spa2/status") == 0
+    assert await limiter.acquire("account1", "spas/spa1/status") > 0
+
+
+async def test_cancelled_waiter():
+    limiter = smarttub.RateLimiter(rate=50, burst=1)
+    await limiter.acquire("account1", "spas/spa1/status")
+    cancelled = asyncio.create_task(limiter.acquire("account1", "spas/spa1/status"))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    waiting = asyncio.create_task(limiter.acquire("account1", "spas/spa1/status"))
+    await asyncio.wait_for(waiting, 1)
+    assert cancelled.cancelled()
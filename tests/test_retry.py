@@ -0,0 +1,79 @@
+import email.utils
+import time
+import types
+
+import pytest
+
+import smarttub
+from smarttub.retry import parse_retry_after
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_retry_policy():
+    policy = smarttub.RetryPolicy(base_delay=1, max_delay=10)
+    assert policy.retries("GET")
+    assert policy.retries("get")
+    assert not policy.retries("PATCH")
+    assert smarttub.RetryPolicy(methods=["GET", "PATCH"]).retries("PATCH")
+
+    delay = None
+    for _ in range(100):
+        previous = delay if delay is not None else policy.base_delay
+        delay = policy.backoff(delay)
+        assert policy.base_delay <= delay <= min(policy.max_delay, previous * 3)
+
+    with pytest.raises(ValueError):
+        smarttub.RetryPolicy(attempts=0)
+
+
+async def test_parse_retry_after():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("") is None
+    assert parse_retry_after("garbage") is None
+    assert parse_retry_after("5") == 5
+    assert parse_retry_after("-5") == 0
+    retry_at = email.utils.formatdate(time.time() + 60, usegmt=True)
+    assert 55 < parse_retry_after(retry_at) <= 60
+
+
+async def test_circuit_breaker(monkeypatch):
+    now = 1000.0
+    clock = types.SimpleNamespace(monotonic=lambda: now)
+    monkeypatch.setattr(smarttub.retry, "time", clock)
+
+    breaker = smarttub.CircuitBreaker(failure_threshold=3, recovery_timeout=30)
+    for _ in range(2):
+        breaker.record_failure("spas/id1/status")
+    assert breaker.allow("spas/id1/status")
+    breaker.record_failure("spas/id1/status")
+    assert breaker.is_open("spas/id1/status")
+    assert not breaker.allow("spas/id1/status")
+    assert breaker.allow("spas/id2/status")
+
+    # half-open: a single trial request is allowed
+    now += 30
+    assert breaker.allow("spas/id1/status")
+    assert not breaker.allow("spas/id1/status")
+
+    # a failed trial keeps the circuit open
+    breaker.record_failure("spas/id1/status")
+    assert not breaker.allow("spas/id1/status")
+
+    # a successful trial closes the circuit
+    now += 30
+    assert breaker.allow("spas/id1/status")
+    breaker.record_success("spas/id1/status")
+    assert not breaker.is_open("spas/id1/status")
+    assert breaker.allow("spas/id1/status")
+
+
+async def test_circuit_breaker_endpoint():
+    endpoint = smarttub.CircuitBreaker.endpoint
+    assert endpoint("spas/id1/status") == "spas/*/status"
+    assert endpoint("spas/id2/status") == "spas/*/status"
+    assert endpoint("spas/id1") == "spas/*"
+    assert endpoint("spas?ownerId=id1") == "spas"
+    assert endpoint("accounts/id1") == "accounts/*"
+    assert endpoint("spas/id1/pumps/P1/toggle") == "spas/*/pumps/*/toggle"
+    assert endpoint("spas/id1/clearray/toggle") == "spas/*/clearray/toggle"
@@ -1,6 +1,7 @@
+import asyncio
 import datetime
 from dateutil.tz import tzutc
-from unittest.mock import create_autospec
+from unittest.mock import call, create_autospec
 import copy
 
 import pytest
@@ -626,7 +627,7 @@ async def test_set_heat_mode(mock_api, spa):
     setup_state_change_mock(mock_api, patch_args, {"heatMode": "AUTO"})
     await spa.set_heat_mode(smarttub.Spa.HeatMode.AUTO)
     mock_api.request.assert_any_call(*patch_args)
-    mock_api.request.assert_any_call("GET", f"spas/{spa.id}/status", None)
+    mock_api.request.assert_any_call("GET", f"spas/{spa.id}/status", None, cache=False)
 
 
 async def test_set_temperature(mock_api, spa):
@@ -634,7 +635,7 @@ async def test_set_temperature(mock_api, spa):
     setup_state_change_mock(mock_api, patch_args, {"setTemperature": 38.3})
     await spa.set_temperature(38.3)
     mock_api.request.assert_any_call(*patch_args)
-    mock_api.request.assert_any_call("GET", f"spas/{spa.id}/status", None)
+    mock_api.request.assert_any_call("GET", f"spas/{spa.id}/status", None, cache=False)
 
 
 async def test_toggle_clearray(mock_api, spa):
@@ -653,7 +654,7 @@ async def test_set_temperature_format(mock_api, spa):
     )
     await spa.set_temperature_format(smarttub.Spa.TemperatureFormat.FAHRENHEIT)
     mock_api.request.assert_any_call(*patch_args)
-    mock_api.request.assert_any_call("GET", f"spas/{spa.id}/status", None)
+    mock_api.request.assert_any_call("GET", f"spas/{spa.id}/status", None, cache=False)
 
 
 async def test_set_date_time(mock_api, spa):
@@ -693,3 +694,477 @@ async def test_secondary_filtration_cycle(mock_api, spa):
     mock_api.request.assert_called_with(
         "PATCH", f"spas/{spa.id}/config", {"secondaryFiltrationConfig": "FREQUENT"}
     )
+
+
+async def test_get_status_full_coalesced(mock_api, spa):
+    async def slow_request(*args):
+        await asyncio.sleep(0.01)
+        return canonical_full_status()
+
+    mock_api.request.side_effect = slow_request
+    states = await asyncio.gather(*[spa.get_status_full() for _ in range(5)])
+    assert mock_api.request.call_count == 1
+    assert all(state is states[0] for state in states)
+
+
+async def test_get_status_full_reuses_parse(mock_api, spa):
+    full_status = canonical_full_status()
+    mock_api.request.return_value = full_status
+    first = await spa.get_status_full()
+    # the API returned the very same (unchanged) response
+    assert await spa.get_status_full() is first
+
+    mock_api.request.return_value = canonical_full_status(heater="ON")
+    changed = await spa.get_status_full()
+    assert changed is not first
+    assert changed.heater == "ON"
+
+
+async def test_get_snapshot(mock_api, spa):
+    active = 0
+    max_active = 0
+
+    async def request(method, path, body=None, cache=True):
+        nonlocal active, max_active
+        active += 1
+        max_active = max(max_active, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        resource = path.split("/")[-1]
+        if resource == "errors":
+            raise smarttub.APIError("errors unavailable")
+        return {
+            "fullStatus": canonical_full_status(),
+            "reminders": {"reminders": []},
+            "energyUsage": {"buckets": [{"kwh": 1.0}]},
+            "debugStatus": {"debugStatus": {"key": "value"}},
+        }[resource]
+
+    mock_api.request.side_effect = request
+    snapshot = await spa.get_snapshot(max_concurrency=2)
+    assert str(snapshot)
+    assert max_active == 2
+    assert isinstance(snapshot.status, smarttub.SpaStateFull)
+    assert snapshot.reminders == []
+    assert snapshot.energy_usage == [{"kwh": 1.0}]
+    assert snapshot.debug_status == {"key": "value"}
+    assert snapshot.errors is None
+    assert not snapshot.complete
+    assert isinstance(snapshot.failures["errors"], smarttub.APIError)
+
+    mock_api.request.reset_mock()
+    snapshot = await spa.get_snapshot(include=["debug_status"])
+    assert snapshot.complete
+    assert snapshot.status is None
+    mock_api.request.assert_called_once_with("GET", f"spas/{spa.id}/debugStatus", None)
+
+    with pytest.raises(ValueError):
+        await spa.get_snapshot(include=["bogus"])
+
+
+async def test_components_are_canonical(mock_api, spa):
+    mock_api.request.return_value = canonical_full_status()
+    first = await spa.get_status_full()
+    pump = first.pumps[0]
+    lock = first.locks["access"]
+
+    mock_api.request.return_value = canonical_full_status(
+        pumps=[{**first.properties["pumps"][0], "state": "HIGH"}],
+        locks={**first.properties["locks"], "access": "LOCKED"},
+    )
+    second = await spa.get_status_full()
+    assert second is not first
+    # what changed is new, and replaces the old object as the canonical one
+    assert second.pumps[0] is not pump
+    assert second.pumps[0].state == smarttub.SpaPump.PumpState.HIGH
+    assert pump.state == smarttub.SpaPump.PumpState.OFF
+    assert second.locks["access"] is not lock
+    assert second.locks["access"].state == "LOCKED"
+    assert lock.state == "UNLOCKED"
+    pump = second.pumps[0]
+
+    mock_api.request.return_value = {"pumps": second.properties["pumps"]}
+    assert (await spa.get_pumps())[0] is pump
+
+
+async def test_state_full_from_previous(mock_api, spa):
+    mock_api.request.return_value = canonical_full_status()
+    first = await spa.get_status_full()
+    water = first.water
+    locks = first.locks
+
+    changed = canonical_full_status()
+    changed["pumps"][0]["state"] = "HIGH"
+    changed["locks"]["spa"] = "LOCKED"
+    second = smarttub.SpaStateFull.from_previous(first, changed)
+    assert second.pumps[0] is not first.pumps[0]
+    assert second.pumps[1] is first.pumps[1]
+    assert second.lights[0] is first.lights[0]
+    assert second.water is water
+    assert second.locks["access"] is locks["access"]
+    assert second.locks["spa"] is not locks["spa"]
+    assert second.locks["spa"].state == "LOCKED"
+    key = ("SpaPump", spa.id, "P1")
+    assert mock_api.identity_map.get(key) is second.pumps[0]
+
+    # unconverted fields are converted afresh
+    third = smarttub.SpaStateFull.from_previous(second, canonical_full_status())
+    assert third.pumps[0].state == smarttub.SpaPump.PumpState.OFF
+    assert third.water is water
+    assert third.blowout_cycle == first.blowout_cycle
+
+
+async def test_get_pumps_leaves_states_alone(mock_api, spa):
+    mock_api.request.return_value = canonical_full_status()
+    first = await spa.get_status_full()
+    pumps = copy.deepcopy(first.properties["pumps"])
+    pumps[0]["state"] = "HIGH"
+    mock_api.request.return_value = {"pumps": pumps}
+    pump = (await spa.get_pumps())[0]
+    assert pump.state == smarttub.SpaPump.PumpState.HIGH
+    assert first.pumps[0].state == smarttub.SpaPump.PumpState.OFF
+    assert (await spa.get_pumps())[0] is pump
+
+    mock_api.request.return_value = canonical_full_status()
+    second = await spa.get_status_full()
+    assert second.pumps[0].state == smarttub.SpaPump.PumpState.OFF
+    assert pump.state == smarttub.SpaPump.PumpState.HIGH
+
+
+async def test_state_full_from_previous_lazy_locks(mock_api, spa):
+    mock_api.request.return_value = canonical_full_status()
+    first = await spa.get_status_full()
+    mock_api.request.return_value = canonical_full_status(
+        locks={**first.properties["locks"], "access": "LOCKED"}
+    )
+    second = await spa.get_status_full()
+    assert second.locks["access"].state == "LOCKED"
+
+    # converting the older state's locks late leaves the newer state's alone
+    assert first.locks["access"].state == "UNLOCKED"
+    assert second.locks["access"].state == "LOCKED"
+    assert first.locks["access"] is not second.locks["access"]
+    assert first.locks["spa"] is second.locks["spa"]
+    key = ("SpaLock", spa.id, "access")
+    assert mock_api.identity_map.get(key) is second.locks["access"]
+
+
+async def test_state_serialization(mock_api, spa):
+    mock_api.request.return_value = canonical_full_status()
+    state = await spa.get_status_full()
+
+    data = state.to_bytes()
+    assert isinstance(data, bytes)
+    assert state.to_dict()["type"] == "SpaStateFull"
+    loaded = smarttub.SpaStateFull.from_bytes(data, spa)
+    assert type(loaded) is smarttub.SpaStateFull
+    assert loaded.spa is spa
+    assert loaded.properties == state.properties
+    assert loaded.water.temperature == state.water.temperature
+    assert loaded.last_updated == state.last_updated
+    assert loaded.pumps[0].id == "P1"
+    assert smarttub.SpaState.from_bytes(data, spa).heater == state.heater
+
+    water = smarttub.SpaState.from_bytes(state.water.to_bytes(), spa)
+    assert type(water) is smarttub.SpaWaterState
+
+    plain = smarttub.SpaState.from_bytes(smarttub.SpaState(spa).to_bytes(), spa)
+    assert type(plain) is smarttub.SpaState
+
+    with pytest.raises(ValueError):
+        smarttub.SpaStateFull.from_bytes(state.water.to_bytes(), spa)
+    with pytest.raises(ValueError):
+        smarttub.SpaState.from_bytes(b"STS\x02" + data[4:], spa)
+    with pytest.raises(ValueError):
+        smarttub.SpaState.from_bytes(b"{}", spa)
+    other = smarttub.Spa(
+        mock_api, spa.account, id="other", brand="b", model="m", name="n"
+    )
+    with pytest.raises(ValueError):
+        smarttub.SpaState.from_bytes(data, other)
+
+
+async def test_state_deserialization_detached(mock_api, spa):
+    mock_api.request.return_value = canonical_full_status()
+    old = (await spa.get_status_full()).to_bytes()
+
+    changed = canonical_full_status(locks={"access": "LOCKED", "spa": "LOCKED"})
+    changed["pumps"][0]["state"] = "HIGH"
+    mock_api.request.return_value = changed
+    current = await spa.get_status_full()
+    pump = current.pumps[0]
+    lock = current.locks["access"]
+
+    loaded = smarttub.SpaStateFull.from_bytes(old, spa)
+    assert loaded.pumps[0].state == smarttub.SpaPump.PumpState.OFF
+    assert loaded.locks["access"].state == "UNLOCKED"
+    # the spa's current components are untouched
+    assert pump.state == smarttub.SpaPump.PumpState.HIGH
+    assert lock.state == "LOCKED"
+    assert mock_api.identity_map.get(("SpaPump", spa.id, "P1")) is pump
+    assert mock_api.identity_map.get(("SpaLock", spa.id, "access")) is lock
+
+
+async def test_wait_for_state_change_shared(mock_api, spa, monkeypatch):
+    monkeypatch.setattr(smarttub.api._StateWatcher, "INITIAL_INTERVAL", 0.01)
+
+    async def request(method, path, body=None, cache=True):
+        heater = "ON" if mock_api.request.call_count >= 3 else "OFF"
+        return canonical_full_status(heater=heater)
+
+    mock_api.request.side_effect = request
+    states = await asyncio.gather(
+        spa._wait_for_state_change(
+            lambda state: state.heater == "ON",
+            get_status_method=spa.get_status_full,
+        ),
+        spa._wait_for_state_change(lambda state: state.heater == "ON"),
+        spa._wait_for_state_change(lambda state: state.heater == "OFF"),
+    )
+    assert [state.heater for state in states] == ["ON", "ON", "OFF"]
+    # one poll of the full status served all three waiters
+    assert mock_api.request.call_count == 3
+    mock_api.request.assert_called_with(
+        "GET", f"spas/{spa.id}/fullStatus", None, cache=False
+    )
+    assert spa._watcher._task is None
+
+
+async def test_wait_for_state_change_timeout(mock_api, spa, monkeypatch):
+    monkeypatch.setattr(smarttub.api._StateWatcher, "INITIAL_INTERVAL", 0.01)
+    mock_api.request.side_effect = lambda *args, **kwargs: canonical_status()
+    with pytest.raises(RuntimeError):
+        await spa._wait_for_state_change(lambda state: False, timeout=0.1)
+    # polling backs off, and stops once nobody is waiting
+    assert 2 < spa._watcher.polls < 10
+    await asyncio.sleep(0)
+    assert spa._watcher._task is None
+
+
+async def test_wait_for_state_change_poll_error(mock_api, spa):
+    mock_api.request.side_effect = smarttub.APIError("unavailable")
+    results = await asyncio.gather(
+        spa._wait_for_state_change(lambda state: True),
+        spa._wait_for_state_change(lambda state: True),
+        return_exceptions=True,
+    )
+    # one failed poll fails everything waiting for it
+    assert all(isinstance(result, smarttub.APIError) for result in results)
+    assert spa._watcher.polls == 1
+
+
+async def test_config_writes_merged(mock_api, spa):
+    def request(method, path, body=None, cache=True):
+        if method == "GET":
+            return canonical_status(heatMode="ECONOMY", setTemperature=39.0)
+
+    mock_api.request.side_effect = request
+    await asyncio.gather(
+        spa.set_temperature(39),
+        spa.set_heat_mode(smarttub.Spa.HeatMode.ECONOMY),
+    )
+    # one write and one poll for both changes
+    assert mock_api.request.call_args_list == [
+        (
+            (
+                "PATCH",
+                f"spas/{spa.id}/config",
+                {"setTemperature": 39, "heatMode": "ECONOMY"},
+            ),
+        ),
+        call("GET", f"spas/{spa.id}/status", None, cache=False),
+    ]
+
+    # the fresh status shows nothing needs changing
+    mock_api.request.reset_mock()
+    await spa.set_temperature(39)
+    mock_api.request.assert_not_called()
+
+
+async def test_config_writes_confirmation_failed(mock_api, spa):
+    def request(method, path, body=None, cache=True):
+        if method == "GET":
+            raise smarttub.APIError("unavailable")
+
+    mock_api.request.side_effect = request
+    results = await asyncio.gather(
+        spa.set_temperature(39),
+        spa.set_heat_mode(smarttub.Spa.HeatMode.ECONOMY),
+        return_exceptions=True,
+    )
+    # the write was sent, but neither change could be confirmed
+    assert all(isinstance(result, smarttub.APIError) for result in results)
+    assert mock_api.request.call_count == 2
+
+
+async def test_config_writes_to_same_key(mock_api, spa):
+    def request(method, path, body=None, cache=True):
+        if method == "GET":
+            return canonical_status(setTemperature=38.0)
+
+    mock_api.request.side_effect = request
+    await asyncio.gather(spa.set_temperature(37), spa.set_temperature(38))
+    # the last write wins, and confirms both
+    assert mock_api.request.call_count == 2
+    mock_api.request.assert_any_call(
+        "PATCH", f"spas/{spa.id}/config", {"setTemperature": 38}
+    )
+
+
+async def test_config_write_not_skipped_while_queued(mock_api, spa):
+    set_temperature = 38.0
+
+    def request(method, path, body=None, cache=True):
+        nonlocal set_temperature
+        if method == "PATCH":
+            set_temperature = body["setTemperature"]
+            return None
+        return canonical_status(setTemperature=set_temperature)
+
+    mock_api.request.side_effect = request
+    await spa.get_status()
+    # the status already says 38, but the queued write of 37 must not win
+    await asyncio.gather(spa.set_temperature(37), spa.set_temperature(38))
+    mock_api.request.assert_any_call(
+        "PATCH", f"spas/{spa.id}/config", {"setTemperature": 38}
+    )
+    assert set_temperature == 38
+    assert spa.last_status.set_temperature == 38
+
+
+async def test_optimistic_change(mock_api, spa):
+    set_temperature = 38.0
+
+    def request(method, path, body=None, cache=True):
+        nonlocal set_temperature
+        if method == "PATCH":
+            set_temperature = body["setTemperature"]
+            return None
+        return canonical_status(setTemperature=set_temperature)
+
+    mock_api.request.side_effect = request
+    await spa.get_status()
+    change = await spa.set_temperature(39.5, optimistic=True)
+    # shown immediately, before anything was sent
+    assert spa.last_status.set_temperature == 39.5
+    assert not change.done()
+    assert mock_api.request.call_count == 1
+
+    await change
+    assert change.confirmed
+    assert spa.last_status.set_temperature == 39.5
+    assert spa.last_status.properties["setTemperature"] == 39.5
+
+
+async def test_optimistic_changes_to_same_key(mock_api, spa):
+    set_temperature = 38.0
+
+    def request(method, path, body=None, cache=True):
+        nonlocal set_temperature
+        if method == "PATCH":
+            set_temperature = body["setTemperature"]
+            return None
+        return canonical_status(setTemperature=set_temperature)
+
+    mock_api.request.side_effect = request
+    await spa.get_status()
+    first = await spa.set_temperature(37, optimistic=True)
+    second = await spa.set_temperature(38, optimistic=True)
+    await first
+    await second
+    assert set_temperature == 38
+    assert spa.last_status.set_temperature == 38
+
+
+async def test_optimistic_change_without_status(mock_api, spa):
+    mock_api.request.side_effect = lambda *args, **kwargs: canonical_status(
+        setTemperature=39.5
+    )
+    assert spa.last_status is None
+    change = await spa.set_temperature(39.5, optimistic=True)
+    assert spa.last_status.set_temperature == 39.5
+    assert spa.last_status.heat_mode is None
+    await change
+    assert spa.last_status.properties["setTemperature"] == 39.5
+
+
+async def test_optimistic_change_rolled_back(mock_api, spa):
+    def request(method, path, body=None, cache=True):
+        if method == "PATCH":
+            raise smarttub.APIError("rejected")
+        return canonical_status(heatMode="AUTO")
+
+    mock_api.request.side_effect = request
+    await spa.get_status()
+    change = await spa.set_heat_mode(smarttub.Spa.HeatMode.ECONOMY, optimistic=True)
+    assert spa.last_status.heat_mode == smarttub.Spa.HeatMode.ECONOMY
+    with pytest.raises(smarttub.APIError):
+        await change
+    assert change.done() and not change.confirmed
+    assert spa.last_status.heat_mode == smarttub.Spa.HeatMode.AUTO
+
+
+async def test_watch(mock_api, spa):
+    responses = [
+        canonical_full_status(lastUpdated="2021-03-07T22:05:21.288Z"),
+        # nothing changed, according to lastUpdated
+        canonical_full_status(lastUpdated="2021-03-07T22:05:21.288Z", heater="ON"),
+        canonical_full_status(lastUpdated="2021-03-07T22:06:00.000Z", heater="ON"),
+    ]
+    responses[2]["pumps"][0]["state"] = "HIGH"
+    responses[2]["locks"]["access"] = "LOCKED"
+    mock_api.request.side_effect = responses
+
+    changes = []
+    watch = spa.watch(interval=0)
+    async for change in watch:
+        changes.append(change)
+        if len(changes) == 3:
+            break
+    await watch.aclose()
+    assert changes == [
+        smarttub.StateChange("heater", "OFF", "ON"),
+        smarttub.StateChange("locks.access", "UNLOCKED", "LOCKED"),
+        smarttub.StateChange("pumps.P1.state", "OFF", "HIGH"),
+    ]
+
+    mock_api.request.side_effect = [
+        canonical_full_status(),
+        canonical_full_status(
+            heater="ON", ozone="ON", lastUpdated="2021-03-07T22:06:00.000Z"
+        ),
+    ]
+    watch = spa.watch(fields=["ozone", "pumps"], interval=0)
+    assert await watch.__anext__() == smarttub.StateChange("ozone", "OFF", "ON")
+    await watch.aclose()
+
+
+async def test_state_fields_converted_lazily(spa):
+    state = smarttub.SpaState(spa, **canonical_status(date="not a date"))
+    # plain fields are set, converted fields wait until they are read
+    assert state.__dict__["heater"] == "OFF"
+    assert "water" not in state.__dict__
+    assert state.water.temperature == 38.3
+    assert state.water is state.water
+    assert state.properties["water"]["temperature"] == 38.3
+    with pytest.raises(ValueError):
+        state.date
+
+
+async def test_parse_timestamp():
+    import dateutil.parser
+
+    from smarttub.api import _parse_timestamp
+
+    for value in (
+        "2021-03-07T22:04:15.686Z",
+        "2021-03-07T22:04:15Z",
+        "2021-03-07T22:04:15+01:00",
+        "2021-03-07T22:04:15",
+        "2021-03-07",
+    ):
+        parsed = _parse_timestamp(value)
+        expected = dateutil.parser.isoparse(value)
+        assert parsed == expected
+        assert parsed.tzinfo == expected.tzinfo
+        assert _parse_timestamp(value) is parsed